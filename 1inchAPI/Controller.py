@@ -1,24 +1,81 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS, cross_origin
 from dotenv import load_dotenv
+from decimal import Decimal
 import os
-import requests
+import queue
 import time
 
+from cache import TTLCache, all_cache_stats, start_cache_sweeper
+from chart_encoding import parse_chart_options, transform_chart
+from concurrency import fanout_executor, fetch_concurrently
+from disk_cache import disk_cache
+import fastjson
+from gas_poller import GAS_POLL_ENABLED, GAS_POLL_INTERVAL_SECONDS, GasPoller
+from metrics import HTTP_DURATION, HTTP_IN_FLIGHT, HTTP_REQUESTS, render_metrics
+from nft import NFT_CHAIN_IDS, asset_key, collections_for, iter_nft_events, load_nft_assets
+from price_history import get_price_history
+from price_service import get_token_prices
+from orderbook import (CursorError, lookup_order, next_page_cursor, orderbook_hash_request, orderbook_wallet_request,
+                       parse_page_args, record_order, record_orders, sync_wallet_orders)
+from pubsub import TopicHub
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, rate_limiter
+from token_list import TOKEN_LIST_ENABLED, token_list_index
+from token_metadata import fetch_token_metadata, get_token_metadata_many, iter_token_metadata
+from tracing import (detach_trace, finish_profile, finish_trace, get_trace, server_timing, should_profile,
+                     should_trace, span, start_profile, start_trace)
+import upstream
+from upstream import UpstreamError
+from valuation import format_amount, parse_decimals, valuate_balances
+
 # 或是指定 .env 的路徑：
 # load_dotenv(dotenv_path='/path/to/your/.env')
 load_dotenv()
-my_1inch_api_key = os.getenv("1INCH_API_KEY")
 my_wallet_address = os.getenv("WALLET_ADDRESS")
 
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify 與 route 直接回傳 dict / list 時也改用 fastjson 編碼
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return fastjson.dumps(obj, sort_keys=self.sort_keys, default=self.default).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return fastjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(fastjson.dumps(obj, sort_keys=self.sort_keys, default=self.default) + b"\n",
+                                        mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# 建立一個簡易的 in-memory cache, 結構可自行調整
-# 格式: { cache_key: {"data":..., "timestamp":...} }
-combined_balance_cache = {}
-
-CACHE_TTL_SECONDS = 12000  # 資料緩存時間 (秒)，可自行調整
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "12000"))  # 資料緩存時間 (秒)，可自行調整
+# 超過 soft TTL 的資料仍會立即回傳，但同時在背景重新抓取
+CACHE_SOFT_TTL_SECONDS = int(os.getenv("CACHE_SOFT_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CHART_CACHE_TTL_SECONDS = int(os.getenv("CHART_CACHE_TTL_SECONDS", "1800"))
+CHART_CACHE_SOFT_TTL_SECONDS = int(os.getenv("CHART_CACHE_SOFT_TTL_SECONDS", "300"))
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "500"))  # 單次 Batch 最多幾個子請求
+PUSH_WALLET_INTERVAL_SECONDS = float(os.getenv("PUSH_WALLET_INTERVAL_SECONDS", "60"))  # 推播錢包餘額的更新週期
+PUSH_MAX_TOPICS = int(os.getenv("PUSH_MAX_TOPICS", "20"))  # 單一連線最多訂閱幾個 topic
+PUSH_HEARTBEAT_SECONDS = 15
+
+# 有上限、會淘汰的 in-memory cache (LRU + TTL，背景定期清除過期項目)
+# 格式: { (chain_id, wallet_address 小寫): combined_result }
+# 有設定 DISK_CACHE_PATH 時，背後再接一層跨 worker 共用的 SQLite 快取
+combined_balance_cache = TTLCache("combined_balance", CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS,
+                                  CACHE_MAX_BYTES, CACHE_SOFT_TTL_SECONDS, backing=disk_cache)
+# Chart 類 route 共用，key 為 (route, chain_id, ...)
+chart_cache = TTLCache("chart", CACHE_MAX_ENTRIES, CHART_CACHE_TTL_SECONDS,
+                       CACHE_MAX_BYTES, CHART_CACHE_SOFT_TTL_SECONDS, backing=disk_cache)
+start_cache_sweeper()
 
 # 定義網絡名稱與對應的 ChainID (全部以十進位字串表示)
 CHAIN_IDS = {
@@ -38,6 +95,161 @@ CHAIN_IDS = {
     "ethereum": "1"  # Ethereum
 }
 
+# 每條鏈 (去除重複的 chain_id) 的 gas 報價由背景輪詢，保存在記憶體中的 ring buffer
+gas_poller = GasPoller(sorted(set(CHAIN_IDS.values()), key=int))
+
+
+@app.before_request
+def start_background_pollers():
+    # 在真正處理請求的 process 中才啟動 (避免 debug reloader 的父 process 也在輪詢)
+    if GAS_POLL_ENABLED:
+        gas_poller.start()
+    if TOKEN_LIST_ENABLED:
+        # 整份 token 清單載入後，CombinedBalance 的 metadata 大多不必再逐一查詢
+        token_list_index.start(gas_poller.chain_ids)
+
+
+@app.before_request
+def start_request_metrics():
+    # route 以 endpoint 名稱標記 (數量固定)，找不到 route 的請求歸為 unmatched
+    g.metrics_route = request.url_rule.endpoint if request.url_rule is not None else "unmatched"
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(g.metrics_route)
+
+
+@app.after_request
+def record_request_metrics(response):
+    if "metrics_started" in g:
+        HTTP_REQUESTS.inc(g.metrics_route, request.method, str(response.status_code))
+        HTTP_DURATION.observe(time.perf_counter() - g.metrics_started, g.metrics_route)
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error):
+    if "metrics_started" in g:
+        HTTP_IN_FLIGHT.dec(g.metrics_route)
+
+
+@app.before_request
+def start_request_trace():
+    # 帶 X-Debug-Trace 標頭 (或被 TRACE_SAMPLE_RATE 抽中) 的請求記錄 span tree；
+    # PROFILE_ROUTES 中的 route 帶 X-Debug-Profile 標頭 (或被 PROFILE_SAMPLE_RATE 抽中) 時另外記錄 cProfile
+    reason = should_trace(request.headers)
+    if reason:
+        g.trace, g.trace_token = start_trace(g.metrics_route, reason)
+    if should_profile(g.metrics_route, request.headers):
+        g.profiler = start_profile()
+
+
+@app.after_request
+def attach_request_trace(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        response.headers["X-Profile-File"] = finish_profile(profiler, g.metrics_route)
+    trace = g.get("trace")
+    if trace is not None:
+        finish_trace(trace)
+        response.headers["Server-Timing"] = server_timing(trace)
+        response.headers["X-Trace-Id"] = trace.id
+    return response
+
+
+@app.teardown_request
+def detach_request_trace(error):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        detach_trace(token)
+    # 未處理的例外使 after_request 沒有執行時，也要停止 profiler
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        finish_profile(profiler, g.metrics_route)
+
+
+def cached_json_response(value, age, cache_status, reuse=False):
+    # 附上資料年齡 (Age) 與快取狀態 (HIT / STALE / MISS)
+    # reuse=True 表示 value 是快取中的物件：編碼結果、壓縮結果與 ETag 只計算一次
+    with span("serialize"):
+        prepared = fastjson.prepare(value, reuse=reuse)
+    response = prepared_json_response(prepared)
+    response.headers["Age"] = str(int(age))
+    response.headers["X-Cache"] = cache_status
+    return response
+
+
+def prepared_json_response(prepared):
+    # If-None-Match 相符時回 304 (不帶 body)，否則依 Accept-Encoding 回傳預先壓縮的 bytes
+    content_encoding = fastjson.choose_encoding(request.headers.get("Accept-Encoding", ""), len(prepared.body))
+    if prepared.matches(request.headers.get("If-None-Match")):
+        response = Response(status=304)
+    else:
+        with span("compress", encoding=content_encoding or "identity"):
+            body = prepared.encoded(content_encoding)
+        response = Response(body, mimetype="application/json")
+        if content_encoding:
+            response.headers["Content-Encoding"] = content_encoding
+    response.headers["ETag"] = prepared.etag_for(content_encoding)
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def make_chart_transform(options):
+    # 回傳套用 options 的函式；不需要降採樣或改格式時回傳 None (直接編碼原始資料)
+    if not (options["max_points"] or options["resolution"] or options["format"] == "columnar"):
+        return None
+
+    def transform(value):
+        with span("compute.downsample"):
+            return transform_chart(value, options)
+    return transform
+
+
+def chart_response(chart_json, options, age=None, cache_status=None, reuse=False):
+    # 依 max_points / resolution / format 在伺服器端降採樣，並依 Accept-Encoding 壓縮
+    # reuse=True 時同一份快取資料在同一組參數下只降採樣、編碼一次
+    with span("serialize"):
+        prepared = fastjson.prepare(chart_json, reuse=reuse, variant=tuple(sorted(options.items())),
+                                    transform=make_chart_transform(options))
+    response = prepared_json_response(prepared)
+    if age is not None:
+        response.headers["Age"] = str(int(age))
+    if cache_status is not None:
+        response.headers["X-Cache"] = cache_status
+    return response
+
+
+# 上游 1inch API 重試後仍失敗時，統一轉成 JSON 錯誤回應
+@app.errorhandler(UpstreamError)
+def handle_upstream_error(error):
+    return jsonify(error.to_dict()), error.http_status
+
+
+# 監控用：各快取的容量與 hit / miss / eviction 統計
+@app.route('/api/Status/Cache', methods=['GET'])
+def get_CacheStatus():
+    return jsonify(dict(all_cache_stats(), token_list=token_list_index.stats(), prepared_json=fastjson.prepared_stats()))
+
+
+# 監控用：目前各 API family 的 token bucket 水位
+@app.route('/api/Status/RateLimit', methods=['GET'])
+def get_RateLimitStatus():
+    return jsonify(rate_limiter.snapshot())
+
+
+# 除錯用：X-Debug-Trace 請求的完整 span tree (只保留最近 TRACE_KEEP 筆)
+@app.route('/api/Status/Trace/<trace_id>', methods=['GET'])
+def get_TraceStatus(trace_id):
+    trace = get_trace(trace_id)
+    if trace is None:
+        return jsonify({"error": f"找不到 trace：{trace_id}"}), 404
+    return jsonify(trace.to_dict())
+
+
+# Prometheus 抓取用 (text exposition format)
+@app.route('/metrics', methods=['GET'])
+def get_Metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 
 # example
 @app.route('/api/data', methods=['GET'])
@@ -56,24 +268,25 @@ def get_ChartToken(network, token_address):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token-details/v1.0/charts/interval/{chain_id}/{token_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "interval": "24h, 1w, 1m, 1y",
-            "from_time": "1631644261"
-        }
-    }
+    options, error_message = parse_chart_options(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
+
+    def load(priority=PRIORITY_INTERACTIVE):
+        return upstream.get_json(*chart_token_request(chain_id, token_address), priority=priority)
 
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
+    chart_json, age, cache_status = chart_cache.get_or_revalidate(
+        ("ChartToken", chain_id, token_address.lower()), load, lambda: load(PRIORITY_BACKGROUND))
+    return chart_response(chart_json, options, age, cache_status, reuse=True)
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
+
+# 以下 *_request 回傳 (API family, path, params)，Flask 與 ASGI (asgi.py) 版本的 route 共用
+def chart_token_request(chain_id, token_address):
+    params = {
+        "interval": "24h, 1w, 1m, 1y",
+        "from_time": "1631644261"
+    }
+    return "charts", f"/token-details/v1.0/charts/interval/{chain_id}/{token_address}", params
 
 
 # example
@@ -83,24 +296,24 @@ def get_ChartNaiveChain(network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token-details/v1.0/charts/interval/{chain_id}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "interval": "24h, 7d, 30d, 365d",
-            "from_time": "1631644261"
-        }
-    }
+    options, error_message = parse_chart_options(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
 
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
+    def load(priority=PRIORITY_INTERACTIVE):
+        return upstream.get_json(*chart_chain_request(chain_id), priority=priority)
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    chart_json, age, cache_status = chart_cache.get_or_revalidate(
+        ("ChartNaiveChain", chain_id), load, lambda: load(PRIORITY_BACKGROUND))
+    return chart_response(chart_json, options, age, cache_status, reuse=True)
+
+
+def chart_chain_request(chain_id):
+    params = {
+        "interval": "24h, 7d, 30d, 365d",
+        "from_time": "1631644261"
+    }
+    return "charts", f"/token-details/v1.0/charts/interval/{chain_id}", params
 
 
 # example
@@ -112,24 +325,22 @@ def get_HistoryTokenPrice(network, token_address, TimeFrom, TimeTo):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token-details/v1.0/charts/range/{chain_id}/{token_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "from": f"{TimeFrom}",
-            "to": f"{TimeTo}",
-        }
-    }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    if chain_id is None:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+    try:
+        time_from = int(TimeFrom)
+        time_to = int(TimeTo)
+    except ValueError:
+        return jsonify({"error": "TimeFrom / TimeTo 必須是 Unix 秒數"}), 400
+    if time_from > time_to:
+        return jsonify({"error": "TimeFrom 不可大於 TimeTo"}), 400
+    options, error_message = parse_chart_options(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
+
+    # 由本地時間序列回答，只向上游補抓尚未涵蓋的時間區段
+    history, fetched_gaps = get_price_history(chain_id, token_address, time_from, time_to)
+    return chart_response(history, options, cache_status="MISS" if fetched_gaps else "HIT")
 
 
 @app.route('/api/OrderBook/Hash/<network>/<hash_address>', methods=['GET'])
@@ -137,21 +348,16 @@ def get_OrderBookByHash(hash_address, network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/orderbook/v4.0/{chain_id}/order/{hash_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    # 最近查過的訂單由 order_hash_cache 回答
+    indexed = lookup_order(chain_id, hash_address)
+    if indexed is not None:
+        return cached_json_response(indexed[0], indexed[1], "HIT", reuse=True)
+    order = upstream.get_json(*orderbook_hash_request(chain_id, hash_address))
+    record_order(chain_id, hash_address, order)
+    return cached_json_response(order, 0, "MISS")
 
 
 @app.route('/api/OrderBook/Wallet/<network>/<wallet_address>', methods=['GET'])
@@ -159,22 +365,53 @@ def get_OrderBookByWallet(wallet_address, network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/orderbook/v4.0/{chain_id}/address/{wallet_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "limit": "5"
-        }
-    }
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+    try:
+        limit, page = parse_page_args(request.args)
+    except CursorError as error:
+        return jsonify({"error": str(error)}), 400
+
+    # 回傳格式不變 (訂單陣列)；需要翻頁請改用 /orders
+    orders = upstream.get_json(*orderbook_wallet_request(chain_id, wallet_address, limit, page))
+    record_orders(chain_id, wallet_address, orders)
+    return jsonify(orders)
 
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
+@app.route('/api/OrderBook/Wallet/<network>/<wallet_address>/orders', methods=['GET'])
+@cross_origin()
+def get_OrderBookWalletOrders(wallet_address, network):
+    network_key = network.lower()
+    chain_id = CHAIN_IDS.get(network_key)
+
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+    try:
+        limit, page = parse_page_args(request.args)
+    except CursorError as error:
+        return jsonify({"error": str(error)}), 400
+
+    orders = upstream.get_json(*orderbook_wallet_request(chain_id, wallet_address, limit, page))
+    return jsonify(wallet_orders_page(chain_id, wallet_address, orders, limit, page))
+
+
+def wallet_orders_page(chain_id, wallet_address, orders, limit, page):
+    record_orders(chain_id, wallet_address, orders)
+    return {"orders": orders, "limit": limit, "next_cursor": next_page_cursor(orders, limit, page)}
+
+
+@app.route('/api/OrderBook/Wallet/<network>/<wallet_address>/sync', methods=['GET'])
+@cross_origin()
+def get_OrderBookWalletSync(wallet_address, network):
+    network_key = network.lower()
+    chain_id = CHAIN_IDS.get(network_key)
+
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+    try:
+        return jsonify(sync_wallet_orders(chain_id, wallet_address, request.args.get("cursor")))
+    except CursorError as error:
+        return jsonify({"error": str(error)}), 400
 
 
 @app.route('/api/Token/TokenBalance/<network>/<wallet_address>', methods=['GET'])
@@ -182,21 +419,19 @@ def get_TokenBalance(wallet_address, network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/balance/v1.2/{chain_id}/balances/{wallet_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
+    return load_token_balance(chain_id, wallet_address)
+
+
+def load_token_balance(chain_id, wallet_address):
+    return upstream.get_json(*token_balance_request(chain_id, wallet_address))
+
 
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
+def token_balance_request(chain_id, wallet_address):
+    return "balance", f"/balance/v1.2/{chain_id}/balances/{wallet_address}", None
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
+
+def gas_price_request(chain_id):
+    return "gas-price", "/gas-price/v1.5/" + chain_id, None
 
 
 @app.route('/api/Token/TokenInfo/<network>/<token_address>', methods=['GET'])
@@ -204,21 +439,92 @@ def get_TokenInfo(network, token_address):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token/v1.2/{chain_id}/custom/{token_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
+    if chain_id is None:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+
+    # 由長效的 token metadata 快取回答，沒看過的 token 才會打上游
+    token_info = fetch_token_metadata(chain_id, token_address)
+    if not token_info:
+        return jsonify({"error": f"找不到 Token：{token_address}"}), 404
+    return jsonify(token_info)
+
+
+def fetch_wallet_snapshot(chain_id, wallet_address, priority=PRIORITY_INTERACTIVE):
+    # 回傳 {token_address: TokenValuation} (已排除餘額為 0 與灰塵 token)；餘額格式異常時回傳 None
+    # (1) 取得錢包所有 Token 餘額
+    balance_res = upstream.get_json(*token_balance_request(chain_id, wallet_address), priority=priority)
+    if not isinstance(balance_res, dict):
+        return None
+
+    # (2) 取得所有非 0 Token 的價格 (短效價格快取，多個錢包共用)，整個錢包一起估值
+    token_price_map = get_token_prices(chain_id, nonzero_tokens(balance_res), priority)
+    return valuate_balances(chain_id, balance_res, token_price_map)
+
+
+def nonzero_tokens(balance_res):
+    # 餘額為 0 的 token 不需要報價
+    return [token_addr for token_addr, raw_balance_str in balance_res.items() if raw_balance_str not in ("0", "", None)]
+
+
+def build_token_record(valuation, token_info_res):
+    # 把單一 token 的估值與 metadata 組成一筆紀錄
+    token_name = token_info_res.get("name", "Unknown")
+    # 價格回應與已知 metadata 都沒有 decimals 時，才用剛查回來的 metadata (預設 18)
+    # decimals 為 0 是合法值，不能用 or
+    decimals = parse_decimals(token_info_res.get("decimals"))
+    valuation.resolve(decimals if decimals is not None else 18)
+
+    return {
+        "address": valuation.address,
+        "name": f"{token_name}",
+        "decimals": valuation.decimals,
+        "logoURI": token_info_res.get("logoURI"),
+        "balance": format_amount(valuation.amount),
+        "balance_usd": float(valuation.usd),
     }
 
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
+def build_combined_balance(chain_id, wallet_address, priority=PRIORITY_INTERACTIVE):
+    # 實際向上游組出 CombinedBalance 結果；餘額格式異常時回傳 None
+    valuations = fetch_wallet_snapshot(chain_id, wallet_address, priority)
+    if valuations is None:
+        return None
+
+    # (3) 取得 Token Metadata：只查估值後留下來的 token；先查長效 metadata 快取，沒看過的才並行打上游
+    token_info_map = get_token_metadata_many(chain_id, list(valuations), priority)
+    return assemble_combined_balance(valuations, token_info_map)
+
+
+def assemble_combined_balance(valuations, token_info_map):
+    # (4) 組出結果，格式: { token 名稱: 餘額字串 }
+    combined_result = {}
+    with span("compute.balances", tokens=len(valuations)):
+        for token_addr, valuation in valuations.items():
+            record = build_token_record(valuation, token_info_map[token_addr])
+            # decimals 要等 metadata 才知道的 token，在這裡才能判斷是否為灰塵
+            if valuation.is_dust():
+                continue
+            combined_result[record["name"]] = record["balance"]
+
+    return combined_result
+
+
+def load_combined_balance(chain_id, wallet_address):
+    # --- Step 1: 檢查快取；soft TTL 內直接回傳，soft ~ hard TTL 之間回傳舊資料並在背景更新
+    # --- Step 2: 若沒有可用快取，就呼叫外部 API (同一個錢包同時只會組一次，其餘請求共用結果)
+    # 回傳 (combined_result, age, cache_status)
+    return combined_balance_cache.get_or_revalidate(
+        (chain_id, wallet_address.lower()),
+        lambda: build_combined_balance(chain_id, wallet_address),
+        lambda: build_combined_balance(chain_id, wallet_address, PRIORITY_BACKGROUND))
+
+
+def unique_chain_networks():
+    # 多個網絡名稱可能對應同一條鏈 (rabbithole / ethereum 都是 1)，回傳 {chain_id: [network, ...]}
+    chains = {}
+    for network_key, chain_id in CHAIN_IDS.items():
+        chains.setdefault(chain_id, []).append(network_key)
+    return chains
 
 
 @app.route('/api/Token/CombinedBalance/<network>/<wallet_address>', methods=['GET'])
@@ -230,130 +536,219 @@ def get_CombinedBalance(network, wallet_address):
     if not chain_id:
         return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
 
-    # --- Step 1: 檢查快取
-    cache_key = f"{network_key}_{wallet_address}"
-    cache_entry = combined_balance_cache.get(cache_key)
-
-    # 若有快取，且未超過設定的 TTL，就直接回傳快取結果
-    if cache_entry:
-        cached_time = cache_entry["timestamp"]
-        if (time.time() - cached_time) < CACHE_TTL_SECONDS:
-            return jsonify(cache_entry["data"])  # 直接回傳快取資料
-
-    # --- Step 2: 若沒有可用快取，就呼叫外部 API
-    balance_api_url = f"https://api.1inch.dev/balance/v1.2/{chain_id}/balances/{wallet_address}"
-    request_options = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
+    combined_result, age, cache_status = load_combined_balance(chain_id, wallet_address)
+    if combined_result is None:
+        return jsonify({"error": "取得錢包餘額時發生異常"}), 500
+
+    return cached_json_response(combined_result, age, cache_status, reuse=True)
+
+
+def iter_combined_balance_records(chain_id, wallet_address):
+    # 串流版 CombinedBalance：每個 token 的 metadata 一到就產生一筆紀錄，最後產生 summary
+    valuations = fetch_wallet_snapshot(chain_id, wallet_address)
+    if valuations is None:
+        yield {"type": "error", "error": "取得錢包餘額時發生異常"}
+        return
+
+    combined_result = {}
+    total_usd = Decimal(0)
+    for token_addr, token_info_res in iter_token_metadata(chain_id, list(valuations)):
+        valuation = valuations[token_addr]
+        record = build_token_record(valuation, token_info_res)
+        if valuation.is_dust():
+            continue
+        combined_result[record["name"]] = record["balance"]
+        total_usd += valuation.usd
+        yield dict(record, type="token")
+
+    # 順便寫回快取，一般的 CombinedBalance 之後可直接命中
+    combined_balance_cache.set((chain_id, wallet_address.lower()), combined_result)
+    yield {
+        "type": "summary",
+        "chain_id": chain_id,
+        "wallet": wallet_address,
+        "token_count": len(combined_result),
+        "total_usd": float(total_usd),
+        "balances": combined_result,
     }
 
-    headers = request_options.get("headers", {})
-    params = request_options.get("params", {})
 
-    balance_res = requests.get(balance_api_url, headers=headers, params=params).json()
-    if not isinstance(balance_res, dict):
-        return jsonify({"error": "取得錢包餘額時發生異常"}), 500
+def format_stream_record(record, stream_format):
+    data = fastjson.dumps(record, sort_keys=False).decode("utf-8")
+    if stream_format == "sse":
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
 
-    token_addresses = list(balance_res.keys())
+@app.route('/api/Token/CombinedBalance/<network>/<wallet_address>/stream', methods=['GET'])
+@cross_origin()
+def get_CombinedBalanceStream(network, wallet_address):
+    network_key = network.lower()
+    chain_id = CHAIN_IDS.get(network_key)
 
-    # (2) 一次抓取所有 Token 價格
-    joined_tokens = ",".join(token_addresses)
-    price_api_url = f"https://api.1inch.dev/price/v1.1/{chain_id}/?tokens={joined_tokens}"
-    price_res = requests.get(price_api_url, headers=headers).json()
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
 
-    token_price_map = {}
-    if isinstance(price_res, dict) and "tokens" in price_res:
-        token_price_map = price_res["tokens"]
+    stream_format = request_stream_format()
 
-    # (3) 取得 Token Metadata 並計算
-    combined_result = {}
-    for token_addr in token_addresses:
-        time.sleep(1)  # 節流 - 每查一個 token 前暫停 1 秒
-        raw_balance_str = balance_res[token_addr]
+    def generate():
         try:
-            real_balance = int(raw_balance_str)
-        except ValueError:
-            real_balance = 0
+            for record in iter_combined_balance_records(chain_id, wallet_address):
+                yield format_stream_record(record, stream_format)
+        except UpstreamError as error:
+            # 標頭已送出，錯誤改以一筆 error 紀錄通知前端
+            yield format_stream_record(dict(error.to_dict(), type="error"), stream_format)
 
-        token_price_info = token_price_map.get(token_addr.lower(), {})
-        price_usd_str = token_price_info.get("price", "0")
-        decimals_in_price = token_price_info.get("decimals", 18)
+    return stream_response(generate(), stream_format)
 
-        try:
-            price_usd = float(price_usd_str)
-        except ValueError:
-            price_usd = 0
 
-        # 先呼叫 1inch Token Info API
-        token_info_url = f"https://api.1inch.dev/token/v1.2/{chain_id}/custom/{token_addr}"
-        token_info_res = requests.get(token_info_url, headers=headers).json()
-        token_name = token_info_res.get("name", "Unknown")
-        token_decimals = token_info_res.get("decimals", 18)
+def request_stream_format():
+    # ?format=sse 或 Accept: text/event-stream 時使用 Server-Sent Events，否則為 NDJSON
+    stream_format = request.args.get("format")
+    if stream_format not in ("ndjson", "sse"):
+        stream_format = "sse" if "text/event-stream" in request.headers.get("Accept", "") else "ndjson"
+    return stream_format
 
-        true_balance_amount = real_balance / (10 ** token_decimals)
-        balance_in_usd = true_balance_amount * price_usd
-        balance_display_str = f"{true_balance_amount}"
 
-        final_key = f"{token_name}"
-        combined_result[final_key] = balance_display_str
+def stream_response(chunks, stream_format):
+    mimetype = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    response = Response(chunks, mimetype=mimetype)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # 避免 nginx 緩衝整個串流
+    return response
 
-    # --- Step 3: 把結果存進快取
-    combined_balance_cache[cache_key] = {
-        "data": combined_result,
-        "timestamp": time.time()
-    }
 
-    return jsonify(combined_result)
+@app.route('/api/Token/Portfolio/<wallet_address>', methods=['GET'])
+@cross_origin()
+def get_Portfolio(wallet_address):
+    chain_networks = unique_chain_networks()
+
+    # 所有鏈同時查詢，整體時間接近最慢的那條鏈；上游速率仍受共用的 rate_limiter 控制
+    def load_chain(chain_id):
+        try:
+            return load_combined_balance(chain_id, wallet_address), None
+        except UpstreamError as error:
+            return None, error.to_dict()
+
+    chain_results = fetch_concurrently(load_chain, list(chain_networks), executor=fanout_executor)
+
+    chains = {}
+    errors = {}
+    max_age = 0.0
+    cache_statuses = set()
+    for chain_id, (loaded, error) in chain_results.items():
+        if loaded is None or loaded[0] is None:
+            errors[chain_id] = error or {"error": "取得錢包餘額時發生異常"}
+            continue
+        combined_result, age, cache_status = loaded
+        max_age = max(max_age, age)
+        cache_statuses.add(cache_status)
+        chains[chain_id] = {
+            "networks": chain_networks[chain_id],
+            "balances": combined_result,
+        }
+
+    portfolio = {
+        "wallet": wallet_address,
+        "chains": chains,
+        "errors": errors,
+    }
+    # 只要有一條鏈是同步載入就視為 MISS，其次 STALE
+    overall_status = next((s for s in ("MISS", "STALE", "HIT") if s in cache_statuses), "MISS")
+    return cached_json_response(portfolio, max_age, overall_status)
 
 
 @app.route('/api/NFT/<wallet_address>', methods=['GET'])
 def get_NFTs(wallet_address):
-    apiUrl = "https://api.1inch.dev/nft/v2/byaddress"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "chainIds": [1, 137, 8453, 42161, 8217, 43114, 10],
-            "address": f"{wallet_address}"
-        }
-    }
-    headers = requestOptions.get("headers", {})
-    params = requestOptions.get("params", {})
-
-    # 呼叫 1inch API
-    raw_res = requests.get(apiUrl, headers=headers, params=params).json()
-    # raw_res 可能包含結構：
-    # {
-    #   "assets": [
-    #       {
-    #         "name": "...",
-    #         "image_url": "...",
-    #         ...
-    #       },
-    #       ...
-    #   ]
-    # }
-
-    # 取出 assets 陣列 (如果不存在，預設空陣列)
-    assets = raw_res.get("assets", [])
+    chain_ids = parse_nft_chains(request.args.get("chainIds"))
+    if chain_ids is None:
+        return jsonify({"error": f"無效的 chainIds：{request.args.get('chainIds')}"}), 400
+
+    # 各鏈分頁並行抓取 (已快取的鏈不打上游)
+    assets, errors, age, cache_status = load_nft_assets(wallet_address, chain_ids)
+    if errors and not assets:
+        return jsonify({"error": "取得 NFT 時發生異常", "chains": errors}), 502
 
     # 準備要回傳的資料結構：{"NFT名稱": "NFT圖片URL", ...}
+    # 同名的 NFT 不互相覆蓋，重複的名稱後面加上 [chain_id:contract:token_id]
     result = {}
+    for chain_assets in assets.values():
+        for item in chain_assets:
+            nft_name = item.get("name") or "Unknown"
+            if nft_name in result:
+                nft_name = f"{nft_name} [{asset_key(item)}]"
+            result[nft_name] = item.get("image_url") or "No Image"
+
+    response = cached_json_response(result, age, cache_status)
+    if errors:
+        response.headers["X-NFT-Failed-Chains"] = ",".join(errors)
+    return response
+
+
+def parse_nft_chains(text):
+    # ?chainIds=1,137 或網絡名稱 (ethereum,polygon)；未指定時使用 NFT_CHAIN_IDS，格式錯誤回傳 None
+    if not text:
+        return NFT_CHAIN_IDS
+    chain_ids = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        chain_id = part if part.isdigit() else CHAIN_IDS.get(part)
+        if not chain_id:
+            return None
+        if chain_id not in chain_ids:
+            chain_ids.append(chain_id)
+    return chain_ids
+
+
+@app.route('/api/NFT/<wallet_address>/assets', methods=['GET'])
+@cross_origin()
+def get_NFTAssets(wallet_address):
+    chain_ids = parse_nft_chains(request.args.get("chainIds"))
+    if chain_ids is None:
+        return jsonify({"error": f"無效的 chainIds：{request.args.get('chainIds')}"}), 400
+
+    assets, errors, age, cache_status = load_nft_assets(wallet_address, chain_ids)
+    all_assets = [item for chain_assets in assets.values() for item in chain_assets]
+    result = {
+        "wallet": wallet_address,
+        "count": len(all_assets),
+        "assets": all_assets,
+        "collections": collections_for(all_assets),
+        "errors": errors,
+    }
+    return cached_json_response(result, age, cache_status)
 
-    for item in assets:
-        nft_name = item.get("name") or "Unknown"
-        nft_image_url = item.get("image_url") or "No Image"
-
-        # 將 name : image_url 放入字典
-        result[nft_name] = nft_image_url
 
-    # 最終將組合後的 result 回傳
-    return jsonify(result)
+@app.route('/api/NFT/<wallet_address>/stream', methods=['GET'])
+@cross_origin()
+def get_NFTStream(wallet_address):
+    chain_ids = parse_nft_chains(request.args.get("chainIds"))
+    if chain_ids is None:
+        return jsonify({"error": f"無效的 chainIds：{request.args.get('chainIds')}"}), 400
+    stream_format = request_stream_format()
+
+    def generate():
+        # 每一頁到達就送出一筆 assets 紀錄 (附上第一次出現的 collection)，最後送出 summary
+        sent_collections = set()
+        count = 0
+        errors = {}
+        for event in iter_nft_events(wallet_address, chain_ids):
+            if event[0] == "assets":
+                _, chain_id, chain_assets = event
+                collections = collections_for(chain_assets, sent_collections)
+                sent_collections.update(collections)
+                count += len(chain_assets)
+                record = {"type": "assets", "chain_id": chain_id, "assets": chain_assets, "collections": collections}
+            elif event[0] == "done":
+                record = {"type": "chain", "chain_id": event[1], "cache": event[2], "count": len(event[4])}
+            else:
+                errors[event[1]] = event[2]
+                record = dict(event[2], type="error", chain_id=event[1])
+            yield format_stream_record(record, stream_format)
+        yield format_stream_record({"type": "summary", "wallet": wallet_address, "count": count, "errors": errors},
+                                   stream_format)
+
+    return stream_response(generate(), stream_format)
 
 
 @app.route('/api/GasPrice/<network>', methods=['GET'])
@@ -366,21 +761,213 @@ def get_GasPrice(network):
         # 找不到對應的 chain_id 時，回傳錯誤訊息
         return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
 
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
+    # 優先使用背景輪詢的最新報價 (常數時間的記憶體讀取)
+    latest = gas_poller.latest(chain_id)
+    if latest is not None:
+        quote, age = latest
+        return cached_json_response(quote, age, "HIT", reuse=True)
+    return cached_json_response(load_gas_price(chain_id), 0, "MISS", reuse=True)
+
+
+def load_gas_price(chain_id):
+    latest = gas_poller.latest(chain_id)
+    if latest is not None:
+        return latest[0]
+    quote = upstream.get_json(*gas_price_request(chain_id))
+    gas_poller.record(chain_id, quote)
+    return quote
+
+
+def load_push_topic(topic):
+    # 推播 topic 的資料來源：("gas", chain_id) 或 ("wallet", chain_id, wallet_address)
+    if topic[0] == "gas":
+        chain_id = topic[1]
+        latest = gas_poller.latest(chain_id)
+        if latest is not None:
+            return latest[0]
+        quote = upstream.get_json(*gas_price_request(chain_id), priority=PRIORITY_BACKGROUND)
+        gas_poller.record(chain_id, quote)
+        return quote
+
+    _, chain_id, wallet_address = topic
+    combined_result = build_combined_balance(chain_id, wallet_address, PRIORITY_BACKGROUND)
+    if combined_result is not None:
+        # 順便更新快取，一般的 CombinedBalance 請求也能受惠
+        combined_balance_cache.set((chain_id, wallet_address), combined_result)
+    return combined_result
+
+
+# 每個 topic 每個週期只抓一次，再把差異推給所有訂閱者
+push_hub = TopicHub(load_push_topic, {"gas": GAS_POLL_INTERVAL_SECONDS, "wallet": PUSH_WALLET_INTERVAL_SECONDS})
+
+
+def parse_push_topic(text):
+    # "gas:<network>" 或 "wallet:<network>:<wallet_address>"；格式錯誤時回傳 None
+    parts = text.split(":")
+    chain_id = CHAIN_IDS.get(parts[1].lower()) if len(parts) > 1 else None
+    if chain_id is None:
+        return None
+    if parts[0] == "gas" and len(parts) == 2:
+        return "gas", chain_id
+    if parts[0] == "wallet" and len(parts) == 3 and parts[2]:
+        return "wallet", chain_id, parts[2].lower()
+    return None
+
+
+def parse_push_topics(args):
+    # 回傳 (topics, 錯誤訊息)
+    topic_texts = args.getlist("topic")
+    if not topic_texts:
+        return None, "至少需要一個 topic"
+    if len(topic_texts) > PUSH_MAX_TOPICS:
+        return None, f"單一連線最多訂閱 {PUSH_MAX_TOPICS} 個 topic"
+    topics = []
+    for text in topic_texts:
+        topic = parse_push_topic(text)
+        if topic is None:
+            return None, f"無效的 topic：{text}，格式為 gas:<network> 或 wallet:<network>:<address>"
+        topics.append(topic)
+    return list(dict.fromkeys(topics)), None
+
+
+def subscribe_response(body, sub):
+    # 連線結束 (含尚未開始讀取就斷線) 時取消訂閱
+    response = Response(body, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(lambda: push_hub.unsubscribe(sub))
+    return response
+
+
+SUBSCRIBERS_FULL_MESSAGE = "推播連線數已達上限，請稍後再試"
+
+
+@app.route('/api/Subscribe', methods=['GET'])
+@cross_origin()
+def get_Subscribe():
+    # Server-Sent Events：?topic=gas:ethereum&topic=wallet:polygon:0x...
+    topics, error_message = parse_push_topics(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
+    sub = push_hub.subscribe(topics)
+    if sub is None:
+        return jsonify({"error": SUBSCRIBERS_FULL_MESSAGE}), 503
+
+    def generate():
+        yield "retry: 3000\n\n"
+        while not sub.overflowed:
+            try:
+                message = sub.queue.get(timeout=PUSH_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_stream_record(message, "sse")
+        # 消化太慢被踢掉，通知前端重新連線以取得完整 snapshot
+        yield format_stream_record({"type": "overflow"}, "sse")
+
+    return subscribe_response(generate(), sub)
+
+
+@app.route('/api/GasPrice/<network>/History', methods=['GET'])
+def get_GasPriceHistory(network):
+    network_key = network.lower()
+    chain_id = CHAIN_IDS.get(network_key)
+
+    if chain_id is None:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
 
-    apiUrl = "https://api.1inch.dev/gas-price/v1.5/" + chain_id
+    limit = request.args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({"error": "limit 必須是整數"}), 400
+        if limit <= 0:
+            return jsonify({"error": "limit 必須大於 0"}), 400
+
+    # 最近的 gas 報價 (由舊到新) 與各欄位的百分位數
+    return jsonify(gas_poller.history(chain_id, limit))
+
+
+# Batch 子請求：每個 loader 接收 (chain_id, address)，回傳 (HTTP status, data)
+def batch_token_info(chain_id, token_address):
+    token_info = fetch_token_metadata(chain_id, token_address)
+    if not token_info:
+        return 404, {"error": f"找不到 Token：{token_address}"}
+    return 200, token_info
+
+
+def batch_combined_balance(chain_id, wallet_address):
+    combined_result, _, _ = load_combined_balance(chain_id, wallet_address)
+    if combined_result is None:
+        return 500, {"error": "取得錢包餘額時發生異常"}
+    return 200, combined_result
+
+
+BATCH_LOADERS = {
+    "TokenInfo": batch_token_info,
+    "TokenBalance": lambda chain_id, wallet_address: (200, load_token_balance(chain_id, wallet_address)),
+    "GasPrice": lambda chain_id, _: (200, load_gas_price(chain_id)),
+    "CombinedBalance": batch_combined_balance,
+}
+# 不需要 address 的子請求
+BATCH_NETWORK_ONLY = {"GasPrice"}
+
+
+def parse_batch_item(item):
+    # 回傳正規化後的 key (route, chain_id, address 小寫)，或 (None, 錯誤訊息)
+    if not isinstance(item, dict):
+        return None, "子請求必須是 JSON 物件"
+    route = item.get("route")
+    if route not in BATCH_LOADERS:
+        return None, f"不支援的 route：{route}，可用：{', '.join(BATCH_LOADERS)}"
+    network = str(item.get("network", ""))
+    chain_id = CHAIN_IDS.get(network.lower())
+    if chain_id is None:
+        return None, f"無效的網絡名稱：{network}"
+    address = "" if route in BATCH_NETWORK_ONLY else str(item.get("address") or "")
+    if route not in BATCH_NETWORK_ONLY and not address:
+        return None, "缺少 address"
+    return (route, chain_id, address.lower()), None
+
+
+def run_batch_item(key):
+    route, chain_id, address = key
+    try:
+        return BATCH_LOADERS[route](chain_id, address)
+    except UpstreamError as error:
+        return error.http_status, error.to_dict()
+
+
+@app.route('/api/Batch', methods=['POST'])
+@cross_origin()
+def post_Batch():
+    # 請求格式：{"requests": [{"route": "TokenInfo", "network": "ethereum", "address": "0x..."}, ...]}
+    payload = request.get_json(silent=True)
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return jsonify({"error": "請求內容需為 {\"requests\": [...]}"}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"單次最多 {BATCH_MAX_REQUESTS} 個子請求"}), 413
+
+    parsed = [parse_batch_item(item) for item in items]
+    # 重複的子請求只執行一次；全部共用快取、single-flight 與 rate_limiter
+    unique_keys = list(dict.fromkeys(key for key, _ in parsed if key is not None))
+    outcomes = fetch_concurrently(run_batch_item, unique_keys, executor=fanout_executor)
+
+    results = []
+    for key, error_message in parsed:
+        if key is None:
+            results.append({"status": 400, "data": {"error": error_message}})
+        else:
+            status, data = outcomes[key]
+            results.append({"status": status, "data": data})
+
+    return jsonify({
+        "results": results,
+        "unique_requests": len(unique_keys),
+    })
 
-    return requests.get(apiUrl, headers=headers, params=params).json()
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,397 @@
+# ASGI 入口：uvicorn asgi:app --workers 4 (需要 httpx)
+# 與 Controller.py (Flask) 共用同一組 route 規則、快取、rate_limiter 與 before / after_request 流程：
+# 單純轉發上游的 route 以 coroutine 執行，等待 1inch 回應時不佔用執行緒；
+# 其餘 route (Portfolio、串流、Batch 等) 交給執行緒池執行原本的 Flask view
+import asyncio
+import contextvars
+import functools
+import io
+import sys
+
+from flask import jsonify, request
+from flask.signals import request_started
+
+from Controller import (CHAIN_IDS, PUSH_HEARTBEAT_SECONDS, SUBSCRIBERS_FULL_MESSAGE, app as flask_app,
+                        assemble_combined_balance, build_combined_balance, cached_json_response, chart_cache,
+                        chart_chain_request, chart_response, chart_token_request, combined_balance_cache,
+                        format_stream_record, gas_poller, gas_price_request, nonzero_tokens, parse_push_topics,
+                        push_hub, subscribe_response, token_balance_request, wallet_orders_page)
+from chart_encoding import parse_chart_options
+from concurrency import sync_route_executor
+from orderbook import (CursorError, lookup_order, orderbook_hash_request, orderbook_wallet_request, parse_page_args,
+                       record_order, record_orders)
+from price_service import get_token_prices_async
+from pubsub import AsyncSubscription
+from rate_limiter import PRIORITY_BACKGROUND
+from token_metadata import (fetch_token_metadata_async, get_token_metadata_many_async,
+                            known_token_metadata_many_async)
+import upstream
+from valuation import needs_known_decimals, valuate_balances
+
+
+def run_sync(fn, *args):
+    # 在執行緒池中執行同步函式，並帶著目前的 contextvars (Flask 的 request context)
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(sync_route_executor, functools.partial(context.run, fn, *args))
+
+
+# ---- 非阻塞版本的 route，與 Controller.py 中同名的 Flask view 行為相同 ----
+
+async def get_ChartToken(network, token_address):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    options, error_message = parse_chart_options(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
+
+    spec = chart_token_request(chain_id, token_address)
+    chart_json, age, cache_status = await chart_cache.get_or_revalidate_async(
+        ("ChartToken", chain_id, token_address.lower()),
+        lambda: upstream.get_json_async(*spec),
+        lambda: upstream.get_json(*spec, priority=PRIORITY_BACKGROUND))
+    return chart_response(chart_json, options, age, cache_status, reuse=True)
+
+
+async def get_ChartNaiveChain(network):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    options, error_message = parse_chart_options(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
+
+    spec = chart_chain_request(chain_id)
+    chart_json, age, cache_status = await chart_cache.get_or_revalidate_async(
+        ("ChartNaiveChain", chain_id),
+        lambda: upstream.get_json_async(*spec),
+        lambda: upstream.get_json(*spec, priority=PRIORITY_BACKGROUND))
+    return chart_response(chart_json, options, age, cache_status, reuse=True)
+
+
+async def get_OrderBookByHash(hash_address, network):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+
+    indexed = lookup_order(chain_id, hash_address)
+    if indexed is not None:
+        return cached_json_response(indexed[0], indexed[1], "HIT", reuse=True)
+    order = await upstream.get_json_async(*orderbook_hash_request(chain_id, hash_address))
+    record_order(chain_id, hash_address, order)
+    return cached_json_response(order, 0, "MISS")
+
+
+async def get_OrderBookByWallet(wallet_address, network):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+    try:
+        limit, page = parse_page_args(request.args)
+    except CursorError as error:
+        return jsonify({"error": str(error)}), 400
+
+    orders = await upstream.get_json_async(*orderbook_wallet_request(chain_id, wallet_address, limit, page))
+    record_orders(chain_id, wallet_address, orders)
+    return jsonify(orders)
+
+
+async def get_OrderBookWalletOrders(wallet_address, network):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+    try:
+        limit, page = parse_page_args(request.args)
+    except CursorError as error:
+        return jsonify({"error": str(error)}), 400
+
+    orders = await upstream.get_json_async(*orderbook_wallet_request(chain_id, wallet_address, limit, page))
+    return jsonify(wallet_orders_page(chain_id, wallet_address, orders, limit, page))
+
+
+async def get_TokenBalance(wallet_address, network):
+    return await upstream.get_json_async(*token_balance_request(CHAIN_IDS.get(network.lower()), wallet_address))
+
+
+async def get_TokenInfo(network, token_address):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    if chain_id is None:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+
+    token_info = await fetch_token_metadata_async(chain_id, token_address)
+    if not token_info:
+        return jsonify({"error": f"找不到 Token：{token_address}"}), 404
+    return jsonify(token_info)
+
+
+async def build_combined_balance_async(chain_id, wallet_address):
+    balance_res = await upstream.get_json_async(*token_balance_request(chain_id, wallet_address))
+    if not isinstance(balance_res, dict):
+        return None
+
+    # 先估值、濾掉灰塵 token，只為留下來的 token 查 metadata
+    token_addresses = nonzero_tokens(balance_res)
+    token_price_map = await get_token_prices_async(chain_id, token_addresses)
+    # 估值需要的 decimals 先在 event loop 外查好 (可能要讀磁碟層)
+    known_metadata = await known_token_metadata_many_async(
+        chain_id, needs_known_decimals(token_addresses, token_price_map))
+    valuations = valuate_balances(chain_id, balance_res, token_price_map, known_metadata)
+    token_info_map = await get_token_metadata_many_async(chain_id, list(valuations))
+    return assemble_combined_balance(valuations, token_info_map)
+
+
+async def get_CombinedBalance(network, wallet_address):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    if not chain_id:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+
+    # 背景更新沿用同步版本，在 background_executor 中執行
+    combined_result, age, cache_status = await combined_balance_cache.get_or_revalidate_async(
+        (chain_id, wallet_address.lower()),
+        lambda: build_combined_balance_async(chain_id, wallet_address),
+        lambda: build_combined_balance(chain_id, wallet_address, PRIORITY_BACKGROUND))
+    if combined_result is None:
+        return jsonify({"error": "取得錢包餘額時發生異常"}), 500
+
+    return cached_json_response(combined_result, age, cache_status, reuse=True)
+
+
+async def get_GasPrice(network):
+    chain_id = CHAIN_IDS.get(network.lower())
+
+    if chain_id is None:
+        return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
+
+    latest = gas_poller.latest(chain_id)
+    if latest is not None:
+        quote, age = latest
+        return cached_json_response(quote, age, "HIT", reuse=True)
+    quote = await upstream.get_json_async(*gas_price_request(chain_id))
+    gas_poller.record(chain_id, quote)
+    return cached_json_response(quote, 0, "MISS", reuse=True)
+
+
+async def get_Subscribe():
+    # 每個訂閱者一個 asyncio.Queue，由 hub 推入訊息；等待訊息時不佔用執行緒
+    topics, error_message = parse_push_topics(request.args)
+    if error_message:
+        return jsonify({"error": error_message}), 400
+    sub = push_hub.subscribe(topics, AsyncSubscription(topics, asyncio.get_running_loop()))
+    if sub is None:
+        return jsonify({"error": SUBSCRIBERS_FULL_MESSAGE}), 503
+
+    async def generate():
+        yield "retry: 3000\n\n"
+        while not sub.overflowed:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), PUSH_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_stream_record(message, "sse")
+        yield format_stream_record({"type": "overflow"}, "sse")
+
+    # 回應本體由 send_response 直接讀取 async_body
+    response = subscribe_response(iter(()), sub)
+    response.async_body = generate()
+    return response
+
+
+# Flask endpoint 名稱 -> 非阻塞版本；不在表中的 route 以執行緒執行原本的 Flask view
+ASYNC_VIEWS = {
+    "get_ChartToken": get_ChartToken,
+    "get_ChartNaiveChain": get_ChartNaiveChain,
+    "get_OrderBookByHash": get_OrderBookByHash,
+    "get_OrderBookByWallet": get_OrderBookByWallet,
+    "get_OrderBookWalletOrders": get_OrderBookWalletOrders,
+    "get_TokenBalance": get_TokenBalance,
+    "get_TokenInfo": get_TokenInfo,
+    "get_CombinedBalance": get_CombinedBalance,
+    "get_GasPrice": get_GasPrice,
+    "get_Subscribe": get_Subscribe,
+}
+
+
+# ---- ASGI <-> Flask 轉接 ----
+
+def build_environ(scope, body):
+    # 依 ASGI scope 組出 WSGI environ，讓 Flask 的 request / 路由照常運作
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        value = value.decode("latin-1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+async def dispatch_view():
+    rule = request.url_rule
+    view = None
+    if request.routing_exception is None and request.method in ("GET", "HEAD"):
+        view = ASYNC_VIEWS.get(rule.endpoint)
+    if view is None:
+        return await run_sync(flask_app.dispatch_request)
+    return await view(**request.view_args)
+
+
+async def dispatch(environ):
+    # 對應 Flask.wsgi_app / full_dispatch_request，只把 view 的執行換成 dispatch_view
+    with flask_app.request_context(environ):
+        try:
+            try:
+                request_started.send(flask_app)
+                rv = flask_app.preprocess_request()
+                if rv is None:
+                    rv = await dispatch_view()
+            except Exception as error:
+                rv = flask_app.handle_user_exception(error)
+            return flask_app.finalize_request(rv)
+        except Exception as error:
+            return flask_app.handle_exception(error)
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def send_response(response, environ, send, receive):
+    headers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+               for name, value in response.get_wsgi_headers(environ).to_wsgi_list()]
+    body = response.get_app_iter(environ)
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+
+    if getattr(response, "async_body", None) is not None:
+        await send_async_stream(response, send, receive)
+        return
+    if not response.is_streamed:
+        try:
+            await send({"type": "http.response.body", "body": b"".join(body)})
+        finally:
+            response.close()
+        return
+
+    # 串流 (NDJSON / SSE) 的產生器是同步的，每一段都在執行緒中讀取；前端斷線時停止
+    chunks = iter(body)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    pending = None
+    try:
+        while True:
+            pending = run_sync(next, chunks, None)
+            await asyncio.wait({pending, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                return
+            chunk = pending.result()
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        if pending is not None and not pending.done():
+            # 執行緒仍在等下一段 (例如 SSE 等待訊息)，等它結束後再關閉產生器
+            pending.add_done_callback(lambda _: response.close())
+        else:
+            response.close()
+
+
+async def send_async_stream(response, send, receive):
+    # 非阻塞 view 的串流 (async generator)，直接在 event loop 上讀取；前端斷線時停止
+    body = response.async_body
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(body.__anext__())
+            await asyncio.wait({pending, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                return
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                break
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        if pending is not None and not pending.done():
+            pending.cancel()
+            await asyncio.wait({pending})
+        await body.aclose()
+        response.close()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                upstream.get_async_client()  # 沒有安裝 httpx 時在啟動階段就失敗
+            except RuntimeError as error:
+                await send({"type": "lifespan.startup.failed", "message": str(error)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await upstream.close_async_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        # 不支援 WebSocket，推播請改用 /api/Subscribe (SSE)
+        await send({"type": "websocket.close", "code": 1003})
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    environ = build_environ(scope, body)
+    response = await dispatch(environ)
+    await send_response(response, environ, send, receive)
@@ -0,0 +1,323 @@
+import asyncio
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+
+from concurrency import background_executor, sync_route_executor
+from singleflight import AsyncSingleFlight, SingleFlight
+from tracing import annotate, span
+
+logger = logging.getLogger(__name__)
+
+# 背景清除過期項目的週期 (秒)
+CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "60"))
+
+# 所有建立過的快取，供監控與背景清除使用 { name: TTLCache }
+CACHES = {}
+
+
+def estimate_size(value):
+    # 以 JSON 編碼後的長度粗估佔用的記憶體 (bytes)
+    try:
+        return len(json.dumps(value, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class TTLCache:
+    # 執行緒安全的 LRU + TTL 快取，同時限制項目數量與總大小
+    # 格式: { key: (expires_at, value, size, stored_at) }，OrderedDict 尾端為最近使用
+    # ttl_seconds 為 hard TTL；有設定 soft_ttl_seconds 時，超過 soft TTL 的資料仍可回傳，但會在背景更新
+    # backing 為選用的第二層 (disk_cache.DiskCache)：寫入時同步寫入，記憶體 miss 時才去讀
+    def __init__(self, name, max_entries, ttl_seconds, max_bytes=None, soft_ttl_seconds=None, backing=None):
+        self.name = name
+        self.backing = backing
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.soft_ttl_seconds = soft_ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._flight = SingleFlight()  # 同一個 key 的載入 (含背景更新) 同時只跑一次
+        self._async_flight = AsyncSingleFlight()  # ASGI 模式的同步載入
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0  # 因容量不足被淘汰
+        self.expirations = 0  # 因過期被移除
+        self.refresh_errors = 0
+        CACHES[name] = self
+
+    def _remove(self, key):
+        size = self._data.pop(key)[2]
+        self._bytes -= size
+
+    def _count_hit(self, age):
+        if self.is_stale(age):
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+
+    def _memory_entry(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value, _, stored_at = item
+            now = time.time()
+            if expires_at > now:
+                self._data.move_to_end(key)
+                age = now - stored_at
+                self._count_hit(age)
+                return value, age
+            self._remove(key)
+            self.expirations += 1
+            return None
+
+    def _backing_entry(self, key):
+        # 查磁碟層，查到就放回記憶體 (重啟後逐步暖機)；會做 SQLite I/O
+        stored = self.backing.get(self.name, key)
+        if stored is None:
+            return None
+        value, stored_at, expires_at = stored
+        self._store(key, value, stored_at, expires_at)
+        age = time.time() - stored_at
+        with self._lock:
+            self.disk_hits += 1
+            self._count_hit(age)
+        return value, age
+
+    def _count_miss(self, count=1):
+        with self._lock:
+            self.misses += count
+
+    def get_entry(self, key):
+        # 回傳 (value, age_seconds)，沒有或已超過 hard TTL 時回傳 None
+        # 記憶體沒有時才查磁碟層
+        entry = self._memory_entry(key)
+        if entry is None and self.backing is not None:
+            entry = self._backing_entry(key)
+        if entry is None:
+            self._count_miss()
+        return entry
+
+    async def get_entry_async(self, key):
+        # get_entry 的 ASGI 版本：磁碟層在執行緒中查詢，SQLite 被鎖住時不會卡住 event loop
+        entry = self._memory_entry(key)
+        if entry is None and self.backing is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(sync_route_executor, self._backing_entry, key)
+        if entry is None:
+            self._count_miss()
+        return entry
+
+    async def get_many_async(self, keys):
+        # 回傳 {key: value} (不含沒有的 key)；記憶體沒有的 key 一起在同一個執行緒中查磁碟層
+        result = {}
+        missing = []
+        for key in keys:
+            entry = self._memory_entry(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                result[key] = entry[0]
+        if missing and self.backing is not None:
+            def load_from_backing():
+                return {key: entry[0] for key in missing if (entry := self._backing_entry(key)) is not None}
+            result.update(await asyncio.get_running_loop().run_in_executor(sync_route_executor, load_from_backing))
+        self._count_miss(len(keys) - len(result))
+        return result
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def is_stale(self, age):
+        return self.soft_ttl_seconds is not None and age >= self.soft_ttl_seconds
+
+    def peek(self, key, default=None):
+        # 與 get 相同但不更新 LRU 順序與統計，供內部重複檢查使用
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= time.time():
+                return default
+            return item[1]
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        self._store(key, value, now, now + ttl)
+        if self.backing is not None:
+            self.backing.set(self.name, key, value, now, now + ttl)
+
+    def set_in_background(self, key, value, ttl_seconds=None):
+        # 與 set 相同，但磁碟層改在 background_executor 中寫入 (ASGI 模式下不阻塞 event loop)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        self._store(key, value, now, now + ttl)
+        if self.backing is not None:
+            background_executor.submit(self.backing.set, self.name, key, value, now, now + ttl)
+
+    def _store(self, key, value, stored_at, expires_at):
+        # 只寫入記憶體層
+        size = estimate_size(value) if self.max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value, size, stored_at)
+            self._bytes += size
+            # 超過數量或大小上限時，從最久未使用的開始淘汰
+            while self._data and (len(self._data) > self.max_entries
+                                  or (self.max_bytes and self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _load(self, key, loader, ttl_seconds=None):
+        # 同一個 key 同時只會有一個 loader 在跑；loader 回傳 None 時不寫入快取
+        def load_and_store():
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl_seconds)
+            return value
+        return self._flight.do(key, load_and_store)
+
+    def get_or_load(self, key, loader, ttl_seconds=None):
+        value = self.get(key)
+        if value is None:
+            value = self._load(key, loader, ttl_seconds)
+        return value
+
+    def get_or_revalidate(self, key, loader, refresh_loader=None):
+        # stale-while-revalidate：回傳 (value, age_seconds, 狀態)
+        # HIT: soft TTL 內；STALE: soft~hard TTL 之間，先回舊資料並排入背景更新；MISS: 同步載入
+        with span("cache." + self.name):
+            entry = self.get_entry(key)
+            annotate(status="MISS" if entry is None else "STALE" if self.is_stale(entry[1]) else "HIT")
+        if entry is not None:
+            value, age = entry
+            if self.is_stale(age):
+                self.schedule_refresh(key, refresh_loader or loader)
+                return value, age, "STALE"
+            return value, age, "HIT"
+        return self._load(key, loader), 0.0, "MISS"
+
+    async def get_or_revalidate_async(self, key, async_loader, refresh_loader):
+        # get_or_revalidate 的 ASGI 版本：MISS 時 await async_loader()；
+        # 背景更新仍交給 background_executor 以同步的 refresh_loader 執行
+        with span("cache." + self.name):
+            entry = await self.get_entry_async(key)
+            annotate(status="MISS" if entry is None else "STALE" if self.is_stale(entry[1]) else "HIT")
+        if entry is not None:
+            value, age = entry
+            if self.is_stale(age):
+                self.schedule_refresh(key, refresh_loader)
+                return value, age, "STALE"
+            return value, age, "HIT"
+
+        async def load_and_store():
+            value = await async_loader()
+            if value is not None:
+                self.set_in_background(key, value)
+            return value
+        return await self._async_flight.do(key, load_and_store), 0.0, "MISS"
+
+    def schedule_refresh(self, key, loader):
+        # 在背景重新載入，同一個 key 同時只排一次
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key, loader)
+            except Exception:
+                self.refresh_errors += 1
+                logger.exception("背景更新快取失敗：%s %r", self.name, key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        background_executor.submit(refresh)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+        if self.backing is not None:
+            self.backing.delete(self.name, key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, item in self._data.items() if item[0] <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "soft_ttl_seconds": self.soft_ttl_seconds,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "disk_hits": self.disk_hits,
+                "disk_tier": self.backing is not None,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "refresh_errors": self.refresh_errors,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def all_cache_stats():
+    result = {name: cache.stats() for name, cache in CACHES.items()}
+    for backing in {id(c.backing): c.backing for c in CACHES.values() if c.backing is not None}.values():
+        result["disk"] = backing.stats()
+    return result
+
+
+_sweeper_started = False
+_sweeper_lock = threading.Lock()
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(CACHE_SWEEP_INTERVAL_SECONDS)
+        backings = {}
+        for cache in list(CACHES.values()):
+            cache.purge_expired()
+            if cache.backing is not None:
+                backings[id(cache.backing)] = cache.backing
+        for backing in backings.values():
+            backing.purge_expired()
+
+
+def start_cache_sweeper():
+    # 啟動 (只會啟動一次) 背景執行緒，定期把所有快取中過期的項目真正刪除
+    global _sweeper_started
+    with _sweeper_lock:
+        if _sweeper_started:
+            return
+        _sweeper_started = True
+    threading.Thread(target=_sweep_forever, name="cache-sweeper", daemon=True).start()
@@ -0,0 +1,134 @@
+import math
+
+RESOLUTION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_resolution(text):
+    # "300" / "5m" / "1h" / "1d" -> 秒數；格式錯誤時回傳 None
+    text = text.strip().lower()
+    unit = RESOLUTION_UNITS.get(text[-1:]) if text else None
+    number = text[:-1] if unit else text
+    try:
+        seconds = int(number) * (unit or 1)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+def parse_chart_options(args):
+    # 讀取 max_points / resolution / format 查詢參數；回傳 (options, 錯誤訊息)
+    options = {"max_points": None, "resolution": None, "format": args.get("format", "json")}
+    if options["format"] not in ("json", "columnar"):
+        return None, "format 只能是 json 或 columnar"
+    if args.get("max_points"):
+        try:
+            options["max_points"] = int(args["max_points"])
+        except ValueError:
+            return None, "max_points 必須是整數"
+        if options["max_points"] < 3:
+            return None, "max_points 至少為 3"
+    if args.get("resolution"):
+        options["resolution"] = parse_resolution(args["resolution"])
+        if options["resolution"] is None:
+            return None, "resolution 格式錯誤，例如 300、5m、1h、1d"
+    return options, None
+
+
+def extract_series(chart_json):
+    # 上游格式: {"data": [{"t": ..., "v": ...}, ...]}，回傳依時間排序的 (times, values)
+    points = []
+    data = chart_json.get("data", []) if isinstance(chart_json, dict) else []
+    for item in data:
+        try:
+            points.append((int(item["t"]), float(item["v"])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    points.sort()
+    return [t for t, _ in points], [v for _, v in points]
+
+
+def lttb(times, values, threshold):
+    # Largest-Triangle-Three-Buckets：保留視覺形狀的前提下降到 threshold 個點
+    n = len(times)
+    if threshold >= n or threshold < 3:
+        return times, values
+
+    sampled_t = [times[0]]
+    sampled_v = [values[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一個 bucket 的平均點
+        next_start = int(math.floor((i + 1) * bucket_size)) + 1
+        next_end = min(int(math.floor((i + 2) * bucket_size)) + 1, n)
+        count = next_end - next_start
+        avg_t = sum(times[next_start:next_end]) / count
+        avg_v = sum(values[next_start:next_end]) / count
+
+        # 目前 bucket 中與 (前一個選中點, 下一個平均點) 形成最大三角形面積的點
+        start = int(math.floor(i * bucket_size)) + 1
+        end = int(math.floor((i + 1) * bucket_size)) + 1
+        at, av = times[a], values[a]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((at - avg_t) * (values[j] - av) - (at - times[j]) * (avg_v - av))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled_t.append(times[best])
+        sampled_v.append(values[best])
+        a = best
+
+    sampled_t.append(times[-1])
+    sampled_v.append(values[-1])
+    return sampled_t, sampled_v
+
+
+def ohlc_buckets(times, values, resolution):
+    # 依固定時間寬度分桶，回傳欄位式 OHLC: {"t": 桶起點, "o", "h", "l", "c"}
+    columns = {"t": [], "o": [], "h": [], "l": [], "c": []}
+    current = None
+    for t, v in zip(times, values):
+        bucket = t - t % resolution
+        if bucket != current:
+            current = bucket
+            columns["t"].append(bucket)
+            columns["o"].append(v)
+            columns["h"].append(v)
+            columns["l"].append(v)
+            columns["c"].append(v)
+        else:
+            if v > columns["h"][-1]:
+                columns["h"][-1] = v
+            if v < columns["l"][-1]:
+                columns["l"][-1] = v
+            columns["c"][-1] = v
+    return columns
+
+
+def transform_chart(chart_json, options):
+    # 依 options 降採樣並輸出 json (列式) 或 columnar (平行陣列) 格式
+    times, values = extract_series(chart_json)
+    resolution = options["resolution"]
+    max_points = options["max_points"]
+
+    if resolution:
+        # 同時給 max_points 時，把桶寬放大到桶數不超過 max_points
+        if max_points and len(times) > 1:
+            # 桶的起點會對齊 resolution，最多多出一桶，因此以 max_points - 1 計算
+            resolution = max(resolution, math.ceil((times[-1] - times[0] + 1) / (max_points - 1)))
+        columns = ohlc_buckets(times, values, resolution)
+        columns["resolution"] = resolution
+    else:
+        if max_points:
+            times, values = lttb(times, values, max_points)
+        columns = {"t": times, "v": values}
+
+    if options["format"] == "columnar":
+        return columns
+    fields = [name for name in ("t", "v", "o", "h", "l", "c") if name in columns]
+    result = {"data": [dict(zip(fields, row)) for row in zip(*(columns[name] for name in fields))]}
+    if "resolution" in columns:
+        result["resolution"] = columns["resolution"]
+    return result
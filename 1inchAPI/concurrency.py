@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import os
+
+# 上游並行抓取的執行緒數量，可透過環境變數調整 (速率上限由 rate_limiter 控制)
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", "16"))
+
+BACKGROUND_MAX_WORKERS = int(os.getenv("BACKGROUND_MAX_WORKERS", "4"))
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+# 推播 topic 同時更新的數量；topic 的 loader 會再把工作丟進 upstream_executor
+PUSH_MAX_WORKERS = int(os.getenv("PUSH_MAX_WORKERS", "4"))
+# ASGI 模式下仍以同步方式執行的 route (Portfolio、串流、Batch 等) 使用的執行緒數
+ASGI_SYNC_MAX_WORKERS = int(os.getenv("ASGI_SYNC_MAX_WORKERS", "64"))
+
+# 整個 process 共用的執行緒池，避免每個 request 各自開一批執行緒
+upstream_executor = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS,
+                                       thread_name_prefix="upstream")
+# 背景更新 (stale-while-revalidate 等) 專用，與 upstream_executor 分開以免互相卡住
+background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_MAX_WORKERS,
+                                         thread_name_prefix="background")
+# 組合型 route (跨鏈 Portfolio 等) 的外層 fan-out，內層工作仍會用到 upstream_executor
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS,
+                                     thread_name_prefix="fanout")
+# 推播 hub 更新 topic 專用；不能用 upstream_executor，否則 loader 在池中等待自己丟進同一個池的工作會 deadlock
+push_executor = ThreadPoolExecutor(max_workers=PUSH_MAX_WORKERS, thread_name_prefix="push")
+# ASGI 模式 (asgi.py) 執行同步 route 與讀取同步串流用
+sync_route_executor = ThreadPoolExecutor(max_workers=ASGI_SYNC_MAX_WORKERS,
+                                         thread_name_prefix="asgi-sync")
+
+
+def fetch_concurrently(fetch_fn, items, executor=upstream_executor):
+    # 將 items 全部丟進執行緒池並行執行，回傳 {item: 結果}
+    # 任何一個 fetch_fn 拋出例外時，會在取結果時原樣拋出
+    futures = {item: submit_with_context(executor, fetch_fn, item) for item in items}
+    return {item: future.result() for item, future in futures.items()}
+
+
+def submit_with_context(executor, fn, *args):
+    # 帶著呼叫端的 contextvars (例如 tracing 的目前 span) 到執行緒池中執行
+    return executor.submit(contextvars.copy_context().run, fn, *args)
@@ -0,0 +1,11 @@
+# 測試共用設定：以 mock_1inch 取代 1inch.dev
+# 各模組在 import 時讀取環境變數，因此要在任何測試模組 import 之前設定
+import os
+
+from mock_1inch import MockConfig, start_mock_server
+
+mock_server, _ = start_mock_server(MockConfig(latency_ms=5, jitter_ms=0, tokens=40))
+os.environ["ONEINCH_API_BASE_URL"] = "http://%s:%d" % mock_server.server_address
+os.environ["UPSTREAM_MAX_RPS"] = "1000"
+os.environ["GAS_POLL_ENABLED"] = "0"
+os.environ["TOKEN_LIST_ENABLED"] = "0"  # 讓錢包 loader 一定會 fan-out 查 metadata
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# 設定 DISK_CACHE_PATH 才會啟用磁碟快取，例如 DISK_CACHE_PATH=/var/cache/1inch/cache.sqlite3
+# 同一台機器上的多個 gunicorn worker 指向同一個檔案即可共用
+DISK_CACHE_PATH = os.getenv("DISK_CACHE_PATH")
+DISK_CACHE_COMPRESS_LEVEL = int(os.getenv("DISK_CACHE_COMPRESS_LEVEL", "1"))
+
+
+def encode_value(value):
+    # 緊湊的二進位格式：無空白的 JSON 再經 zlib 壓縮
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), DISK_CACHE_COMPRESS_LEVEL)
+
+
+def decode_value(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def encode_key(key):
+    # tuple key 轉成穩定的字串
+    return json.dumps(list(key) if isinstance(key, tuple) else key, separators=(",", ":"))
+
+
+class DiskCache:
+    # 以 SQLite (WAL 模式) 實作的第二層快取，可跨 process 安全地同時讀寫
+    # 表格: (namespace, key) -> (value BLOB, stored_at, expires_at)
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value BLOB NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key)"
+                ") WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires_at)")
+        conn.close()  # 避免 fork 之後子 process 沿用同一條連線
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _conn(self):
+        # 每個執行緒 (且每個 process) 各自一條連線
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace, key):
+        # 回傳 (value, stored_at, expires_at)，沒有或已過期時回傳 None
+        try:
+            row = self._conn().execute(
+                "SELECT value, stored_at, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, encode_key(key))).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or row[2] <= time.time():
+            return None
+        try:
+            return decode_value(row[0]), row[1], row[2]
+        except (zlib.error, ValueError):
+            return None
+
+    def set(self, namespace, key, value, stored_at, expires_at):
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, encode_key(key), encode_value(value), stored_at, expires_at))
+        except (sqlite3.Error, TypeError, ValueError):
+            # 磁碟層只是加速用，寫入失敗不影響記憶體層
+            return False
+        return True
+
+    def delete(self, namespace, key):
+        try:
+            self._conn().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                                 (namespace, encode_key(key)))
+        except sqlite3.Error:
+            pass
+
+    def purge_expired(self):
+        try:
+            return self._conn().execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+        except sqlite3.Error:
+            return 0
+
+    def stats(self):
+        try:
+            rows = self._conn().execute(
+                "SELECT namespace, COUNT(*), SUM(LENGTH(value)) FROM cache_entries GROUP BY namespace").fetchall()
+        except sqlite3.Error:
+            rows = []
+        return {
+            "path": self.path,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "namespaces": {namespace: {"entries": count, "bytes": size or 0} for namespace, count, size in rows},
+        }
+
+
+disk_cache = DiskCache(DISK_CACHE_PATH) if DISK_CACHE_PATH else None
@@ -0,0 +1,152 @@
+# 快速 JSON 編碼與預先編碼的回應
+# 有安裝 orjson 時使用 orjson，否則退回標準函式庫 json；輸出與 Flask jsonify 相同 (key 排序、UTF-8)
+# 快取命中時重複使用同一份 bytes、壓縮結果與 ETag，不必每次重新序列化
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from metrics import register_collector
+
+# orjson / brotli 為選用套件
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_GZIP_LEVEL = int(os.getenv("JSON_GZIP_LEVEL", "6"))
+# 小於此大小的回應不壓縮 (壓縮省下的流量不值得 CPU)
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "1024"))
+# 預先編碼結果的 LRU 上限；以快取中的物件本身 (identity) 為 key
+PREPARED_JSON_MAX_ENTRIES = int(os.getenv("PREPARED_JSON_MAX_ENTRIES", "4096"))
+PREPARED_JSON_MAX_BYTES = int(os.getenv("PREPARED_JSON_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def dumps(value, sort_keys=True, default=None):
+    # 回傳 UTF-8 bytes；orjson 不支援的值 (例如超過 64 位元的整數) 改用標準函式庫
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(value, default=default, option=option)
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"),
+                      default=default).encode("utf-8")
+
+
+def loads(data):
+    # 格式錯誤時拋出 ValueError (orjson.JSONDecodeError 也是 ValueError)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class PreparedJSON:
+    # 一份編碼完成的 JSON：原始 bytes、各 Content-Encoding 的壓縮結果 (第一次用到時才壓縮) 與 ETag
+    __slots__ = ("body", "etag", "_encoded")
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self._encoded = {None: body}
+
+    def encoded(self, encoding):
+        # 多個執行緒同時第一次壓縮時只是重複計算，結果相同
+        body = self._encoded.get(encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(self.body)
+            else:
+                body = gzip.compress(self.body, JSON_GZIP_LEVEL)
+            self._encoded[encoding] = body
+        return body
+
+    def etag_for(self, encoding):
+        # strong ETag 依表示法 (壓縮方式) 區分
+        return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+    def matches(self, if_none_match):
+        # If-None-Match 採弱比較：忽略 W/ 前綴；同一份資料的任何壓縮版本都算相符
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == self.etag:
+                return True
+        return False
+
+
+def choose_encoding(accept_encoding, size):
+    # 依用戶端支援選擇 br / gzip；太小的回應不壓縮
+    if size < JSON_COMPRESS_MIN_BYTES or not accept_encoding:
+        return None
+    accept_encoding = accept_encoding.lower()
+    if brotli is not None and "br" in accept_encoding:
+        return "br"
+    if "gzip" in accept_encoding:
+        return "gzip"
+    return None
+
+
+# { (id(value), variant): (value, PreparedJSON) }；保留 value 的參考，避免 id 被其他物件重用
+_prepared = OrderedDict()
+_prepared_bytes = 0
+_prepared_lock = threading.Lock()
+prepared_hits = 0
+prepared_misses = 0
+
+
+def prepare(value, reuse=False, variant=None, transform=None):
+    # 編碼 value (有 transform 時編碼 transform(value))
+    # reuse=True 用於快取中的物件：同一個物件 (與 variant) 只編碼一次，之後直接回傳同一份 PreparedJSON
+    global _prepared_bytes, prepared_hits, prepared_misses
+    if not reuse:
+        return PreparedJSON(dumps(transform(value) if transform else value))
+
+    key = (id(value), variant)
+    with _prepared_lock:
+        item = _prepared.get(key)
+        if item is not None and item[0] is value:
+            _prepared.move_to_end(key)
+            prepared_hits += 1
+            return item[1]
+        prepared_misses += 1
+
+    prepared = PreparedJSON(dumps(transform(value) if transform else value))
+    with _prepared_lock:
+        old = _prepared.pop(key, None)
+        if old is not None:
+            _prepared_bytes -= len(old[1].body)
+        _prepared[key] = (value, prepared)
+        _prepared_bytes += len(prepared.body)
+        # 壓縮結果只佔原始大小的一小部分，不另外計算
+        while _prepared and (len(_prepared) > PREPARED_JSON_MAX_ENTRIES or _prepared_bytes > PREPARED_JSON_MAX_BYTES):
+            _, (_, evicted) = _prepared.popitem(last=False)
+            _prepared_bytes -= len(evicted.body)
+    return prepared
+
+
+def prepared_stats():
+    with _prepared_lock:
+        return {"entries": len(_prepared), "bytes": _prepared_bytes, "hits": prepared_hits,
+                "misses": prepared_misses, "encoder": "orjson" if orjson is not None else "json"}
+
+
+@register_collector
+def collect_prepared_json():
+    stats = prepared_stats()
+    return [
+        ("oneinch_prepared_json_lookups_total", "counter", "Reusable JSON encodings by result",
+         [((("result", "hit"),), stats["hits"]), ((("result", "miss"),), stats["misses"])]),
+        ("oneinch_prepared_json_bytes", "gauge", "Bytes held by reusable JSON encodings", [((), stats["bytes"])]),
+    ]
@@ -0,0 +1,163 @@
+from array import array
+import logging
+import math
+import os
+import threading
+import time
+
+from concurrency import fetch_concurrently
+from rate_limiter import PRIORITY_BACKGROUND
+import upstream
+from upstream import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+GAS_POLL_ENABLED = os.getenv("GAS_POLL_ENABLED", "1") == "1"
+GAS_POLL_INTERVAL_SECONDS = float(os.getenv("GAS_POLL_INTERVAL_SECONDS", "10"))
+GAS_HISTORY_SIZE = int(os.getenv("GAS_HISTORY_SIZE", "360"))  # 預設約 1 小時 (10 秒一筆)
+# 最新報價超過這個年齡就不再直接使用，改為即時查詢
+GAS_MAX_STALENESS_SECONDS = float(os.getenv("GAS_MAX_STALENESS_SECONDS", str(3 * GAS_POLL_INTERVAL_SECONDS)))
+
+# 記錄到 ring buffer 的數值欄位：EIP-1559 鏈取 baseFee 與各檔位的 maxFeePerGas，舊式鏈取 slow / standard / fast
+GAS_FIELDS = ("baseFee", "low", "medium", "high", "instant", "slow", "standard", "fast")
+GAS_PERCENTILES = (10, 50, 90)
+
+
+def quote_values(quote):
+    # 把上游的 gas 報價轉成 GAS_FIELDS 順序的數值 (wei)，缺少的欄位為 NaN
+    values = []
+    for field in GAS_FIELDS:
+        value = quote.get(field) if isinstance(quote, dict) else None
+        if isinstance(value, dict):
+            value = value.get("maxFeePerGas")
+        try:
+            values.append(float(value))
+        except (TypeError, ValueError):
+            values.append(math.nan)
+    return values
+
+
+def percentile(sorted_values, p):
+    # 線性內插的百分位數
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * p / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class GasRing:
+    # 固定大小的環狀緩衝區，時間與各欄位分別存在連續的 array("d") 中
+    def __init__(self, size):
+        self.size = size
+        self.times = array("d", [0.0] * size)
+        self.columns = {field: array("d", [math.nan] * size) for field in GAS_FIELDS}
+        self.count = 0
+        self.head = 0  # 下一筆要寫入的位置
+        self.latest = None
+        self.latest_at = 0.0
+        self.lock = threading.Lock()
+
+    def push(self, timestamp, quote):
+        values = quote_values(quote)
+        with self.lock:
+            self.times[self.head] = timestamp
+            for field, value in zip(GAS_FIELDS, values):
+                self.columns[field][self.head] = value
+            self.head = (self.head + 1) % self.size
+            self.count = min(self.count + 1, self.size)
+            self.latest = quote
+            self.latest_at = timestamp
+
+    def history(self, limit=None):
+        # 由舊到新回傳最近 limit 筆 (times, {field: [values]})
+        with self.lock:
+            n = self.count if limit is None else min(limit, self.count)
+            indexes = [(self.head - n + i) % self.size for i in range(n)]
+            times = [self.times[i] for i in indexes]
+            columns = {field: [self.columns[field][i] for i in indexes] for field in GAS_FIELDS}
+        return times, columns
+
+
+class GasPoller:
+    # 背景執行緒定期抓取每條鏈的 gas 報價，get_GasPrice 直接讀記憶體中的最新值
+    def __init__(self, chain_ids, interval=GAS_POLL_INTERVAL_SECONDS, size=GAS_HISTORY_SIZE):
+        self.chain_ids = list(chain_ids)
+        self.interval = interval
+        self.rings = {chain_id: GasRing(size) for chain_id in self.chain_ids}
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def record(self, chain_id, quote, timestamp=None):
+        ring = self.rings.get(chain_id)
+        if ring is not None and isinstance(quote, dict):
+            ring.push(time.time() if timestamp is None else timestamp, quote)
+
+    def latest(self, chain_id, max_age=GAS_MAX_STALENESS_SECONDS):
+        # 回傳 (quote, age_seconds)，沒有或太舊時回傳 None
+        ring = self.rings.get(chain_id)
+        if ring is None or ring.latest is None:
+            return None
+        age = time.time() - ring.latest_at
+        if age > max_age:
+            return None
+        return ring.latest, age
+
+    def poll_once(self):
+        def fetch(chain_id):
+            try:
+                return upstream.get_json("gas-price", "/gas-price/v1.5/" + chain_id, priority=PRIORITY_BACKGROUND)
+            except UpstreamError as error:
+                logger.warning("gas price 輪詢失敗 (chain %s)：%s", chain_id, error.message)
+                return None
+
+        for chain_id, quote in fetch_concurrently(fetch, self.chain_ids).items():
+            if quote is not None:
+                self.record(chain_id, quote)
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("gas price 輪詢發生未預期錯誤")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        # 只會啟動一次
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="gas-poller", daemon=True).start()
+
+    def history(self, chain_id, limit=None):
+        ring = self.rings.get(chain_id)
+        if ring is None:
+            return None
+        times, columns = ring.history(limit)
+
+        fields = {}
+        percentiles = {}
+        for field, values in columns.items():
+            present = [v for v in values if not math.isnan(v)]
+            if not present:
+                continue
+            fields[field] = [None if math.isnan(v) else v for v in values]
+            ordered = sorted(present)
+            percentiles[field] = {f"p{p}": percentile(ordered, p) for p in GAS_PERCENTILES}
+            percentiles[field]["min"] = ordered[0]
+            percentiles[field]["max"] = ordered[-1]
+
+        return {
+            "chain_id": chain_id,
+            "interval_seconds": self.interval,
+            "count": len(times),
+            "t": times,
+            "fields": fields,
+            "percentiles": percentiles,
+        }
@@ -2,13 +2,14 @@ from flask import Flask, jsonify
 from flask_cors import CORS, cross_origin
 from dotenv import load_dotenv
 import os
-import requests
 import time
 
+import upstream
+from upstream import UpstreamError
+
 # 或是指定 .env 的路徑：
 # load_dotenv(dotenv_path='/path/to/your/.env')
 load_dotenv()
-my_1inch_api_key = os.getenv("1INCH_API_KEY")
 my_wallet_address = os.getenv("WALLET_ADDRESS")
 
 app = Flask(__name__)
@@ -39,6 +40,12 @@ CHAIN_IDS = {
 }
 
 
+# 上游 1inch API 重試後仍失敗時，統一轉成 JSON 錯誤回應
+@app.errorhandler(UpstreamError)
+def handle_upstream_error(error):
+    return jsonify(error.to_dict()), error.http_status
+
+
 # example
 @app.route('/api/data', methods=['GET'])
 def get_data():
@@ -56,24 +63,11 @@ def get_ChartToken(network, token_address):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token-details/v1.0/charts/interval/{chain_id}/{token_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "interval": "24h, 1w, 1m, 1y",
-            "from_time": "1631644261"
-        }
+    params = {
+        "interval": "24h, 1w, 1m, 1y",
+        "from_time": "1631644261"
     }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("charts", f"/token-details/v1.0/charts/interval/{chain_id}/{token_address}", params)
 
 
 # example
@@ -83,24 +77,11 @@ def get_ChartNaiveChain(network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token-details/v1.0/charts/interval/{chain_id}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "interval": "24h, 7d, 30d, 365d",
-            "from_time": "1631644261"
-        }
+    params = {
+        "interval": "24h, 7d, 30d, 365d",
+        "from_time": "1631644261"
     }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("charts", f"/token-details/v1.0/charts/interval/{chain_id}", params)
 
 
 # example
@@ -112,24 +93,11 @@ def get_HistoryTokenPrice(network, token_address, TimeFrom, TimeTo):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token-details/v1.0/charts/range/{chain_id}/{token_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "from": f"{TimeFrom}",
-            "to": f"{TimeTo}",
-        }
+    params = {
+        "from": f"{TimeFrom}",
+        "to": f"{TimeTo}",
     }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("charts", f"/token-details/v1.0/charts/range/{chain_id}/{token_address}", params)
 
 
 @app.route('/api/OrderBook/Hash/<network>/<hash_address>', methods=['GET'])
@@ -137,21 +105,7 @@ def get_OrderBookByHash(hash_address, network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/orderbook/v4.0/{chain_id}/order/{hash_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("orderbook", f"/orderbook/v4.0/{chain_id}/order/{hash_address}")
 
 
 @app.route('/api/OrderBook/Wallet/<network>/<wallet_address>', methods=['GET'])
@@ -159,22 +113,10 @@ def get_OrderBookByWallet(wallet_address, network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/orderbook/v4.0/{chain_id}/address/{wallet_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "limit": "5"
-        }
+    params = {
+        "limit": "5"
     }
-
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("orderbook", f"/orderbook/v4.0/{chain_id}/address/{wallet_address}", params)
 
 
 @app.route('/api/Token/TokenBalance/<network>/<wallet_address>', methods=['GET'])
@@ -182,21 +124,7 @@ def get_TokenBalance(wallet_address, network):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/balance/v1.2/{chain_id}/balances/{wallet_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("balance", f"/balance/v1.2/{chain_id}/balances/{wallet_address}")
 
 
 @app.route('/api/Token/TokenInfo/<network>/<token_address>', methods=['GET'])
@@ -204,21 +132,7 @@ def get_TokenInfo(network, token_address):
     network_key = network.lower()
     chain_id = CHAIN_IDS.get(network_key)
 
-    apiUrl = f"https://api.1inch.dev/token/v1.2/{chain_id}/custom/{token_address}"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("token", f"/token/v1.2/{chain_id}/custom/{token_address}")
 
 
 @app.route('/api/Token/CombinedBalance/<network>/<wallet_address>', methods=['GET'])
@@ -241,19 +155,7 @@ def get_CombinedBalance(network, wallet_address):
             return jsonify(cache_entry["data"])  # 直接回傳快取資料
 
     # --- Step 2: 若沒有可用快取，就呼叫外部 API
-    balance_api_url = f"https://api.1inch.dev/balance/v1.2/{chain_id}/balances/{wallet_address}"
-    request_options = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-
-    headers = request_options.get("headers", {})
-    params = request_options.get("params", {})
-
-    balance_res = requests.get(balance_api_url, headers=headers, params=params).json()
+    balance_res = upstream.get_json("balance", f"/balance/v1.2/{chain_id}/balances/{wallet_address}")
     if not isinstance(balance_res, dict):
         return jsonify({"error": "取得錢包餘額時發生異常"}), 500
 
@@ -262,16 +164,19 @@ def get_CombinedBalance(network, wallet_address):
     # (3) 取得 Token Metadata 並計算
     combined_result = {}
     for token_addr in token_addresses:
-        time.sleep(0.5)  # 節流 - 每查一個 token 前暫停 1 秒
         raw_balance_str = balance_res[token_addr]
         try:
             real_balance = int(raw_balance_str)
         except ValueError:
             real_balance = 0
 
-        # 先呼叫 1inch Token Info API
-        token_info_url = f"https://api.1inch.dev/token/v1.2/{chain_id}/custom/{token_addr}"
-        token_info_res = requests.get(token_info_url, headers=headers).json()
+        # 先呼叫 1inch Token Info API (節流由 upstream 內的 rate_limiter 負責)
+        try:
+            token_info_res = upstream.get_json("token", f"/token/v1.2/{chain_id}/custom/{token_addr}")
+        except UpstreamError as error:
+            if error.http_status == 502:
+                raise
+            token_info_res = {}
         token_name = token_info_res.get("name", "Unknown")
         token_decimals = token_info_res.get("decimals", 18)
         token_img_url = token_info_res.get("logoURI", "Unknown")
@@ -293,22 +198,13 @@ def get_CombinedBalance(network, wallet_address):
 
 @app.route('/api/NFT/<wallet_address>', methods=['GET'])
 def get_NFTs(wallet_address):
-    apiUrl = "https://api.1inch.dev/nft/v2/byaddress"
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {
-            "chainIds": [1, 137, 8453, 42161, 8217, 43114, 10],
-            "address": f"{wallet_address}"
-        }
+    params = {
+        "chainIds": [1, 137, 8453, 42161, 8217, 43114, 10],
+        "address": f"{wallet_address}"
     }
-    headers = requestOptions.get("headers", {})
-    params = requestOptions.get("params", {})
 
     # 呼叫 1inch API
-    raw_res = requests.get(apiUrl, headers=headers, params=params).json()
+    raw_res = upstream.get_json("nft", "/nft/v2/byaddress", params)
     # raw_res 可能包含結構：
     # {
     #   "assets": [
@@ -348,21 +244,7 @@ def get_GasPrice(network):
         # 找不到對應的 chain_id 時，回傳錯誤訊息
         return jsonify({"error": f"無效的網絡名稱：{network}"}), 400
 
-    requestOptions = {
-        "headers": {
-            "Authorization": f"Bearer {my_1inch_api_key}"
-        },
-        "body": "",
-        "params": {}
-    }
-    # Prepare request components
-    headers = requestOptions.get("headers", {})
-    body = requestOptions.get("body", {})
-    params = requestOptions.get("params", {})
-
-    apiUrl = "https://api.1inch.dev/gas-price/v1.5/" + chain_id
-
-    return requests.get(apiUrl, headers=headers, params=params).json()
+    return upstream.get_json("gas-price", "/gas-price/v1.5/" + chain_id)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,245 @@
+# 可重現的壓力測試：預設在同一個 process 內啟動 mock_1inch 與後端，逐一對每個 route 施壓
+# 回報每個 route 的吞吐量、p50 / p95 / p99 延遲、快取命中率與打到上游的次數
+#   python loadbench.py --requests 500 --concurrency 32 --routes CombinedBalance,TokenInfo
+#   python loadbench.py --server asgi            # 改用 asgi.py (需要 httpx、uvicorn)
+#   python loadbench.py --server external --target http://127.0.0.1:5000 --mock-url http://127.0.0.1:8099
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+import requests
+
+from mock_1inch import add_mock_arguments, config_from_args, start_mock_server, token_address
+
+# 每個 route 的 URL 產生方式；ctx 提供固定 seed 的錢包 / token 抽樣
+SCENARIOS = {
+    "TokenInfo": lambda ctx: f"/api/Token/TokenInfo/ethereum/{ctx.token()}",
+    "TokenBalance": lambda ctx: f"/api/Token/TokenBalance/ethereum/{ctx.wallet()}",
+    "CombinedBalance": lambda ctx: f"/api/Token/CombinedBalance/ethereum/{ctx.wallet()}",
+    "CombinedBalanceStream": lambda ctx: f"/api/Token/CombinedBalance/ethereum/{ctx.wallet()}/stream",
+    "Portfolio": lambda ctx: f"/api/Token/Portfolio/{ctx.wallet()}",
+    "ChartToken": lambda ctx: f"/api/Chart/Token/ethereum/{ctx.token()}?max_points=200",
+    "ChartNaiveChain": lambda ctx: f"/api/Chart/NaiveChain/{ctx.network()}",
+    "HistoryTokenPrice": lambda ctx: "/api/Chart/HistoryTokenPrice/ethereum/{}/{}/{}".format(*ctx.window(), ctx.token()),
+    "OrderBookByWallet": lambda ctx: f"/api/OrderBook/Wallet/ethereum/{ctx.wallet()}",
+    "OrderBookOrders": lambda ctx: f"/api/OrderBook/Wallet/ethereum/{ctx.wallet()}/orders?limit=50",
+    "OrderBookSync": lambda ctx: f"/api/OrderBook/Wallet/ethereum/{ctx.wallet()}/sync",
+    "OrderBookByHash": lambda ctx: f"/api/OrderBook/Hash/ethereum/0x{ctx.rng.getrandbits(256):064x}",
+    "NFT": lambda ctx: f"/api/NFT/{ctx.wallet()}",
+    "NFTAssets": lambda ctx: f"/api/NFT/{ctx.wallet()}/assets",
+    "GasPrice": lambda ctx: f"/api/GasPrice/{ctx.network()}",
+}
+NETWORKS = ("ethereum", "polygon", "arbitrum", "base", "optimistic", "binance")
+
+
+class ScenarioContext:
+    def __init__(self, seed, wallets, tokens):
+        self.rng = random.Random(seed)
+        self.wallets = ["0x" + random.Random(f"{seed}-wallet-{i}").getrandbits(160).to_bytes(20, "big").hex()
+                        for i in range(wallets)]
+        self.tokens = [token_address(i) for i in range(tokens)]
+        self.now = int(time.time())
+
+    def wallet(self):
+        return self.rng.choice(self.wallets)
+
+    def token(self):
+        return self.rng.choice(self.tokens)
+
+    def network(self):
+        return self.rng.choice(NETWORKS)
+
+    def window(self):
+        # 最近一天的視窗，終點在一小時內滑動
+        end = self.now - self.rng.randint(0, 3600)
+        return end - 86400, end
+
+
+def percentile(sorted_values, p):
+    # nearest-rank
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"後端沒有在 {timeout} 秒內啟動 (port {port})")
+
+
+def start_backend(kind):
+    # 在同一個 process 啟動後端，回傳 base URL；必須在設定 ONEINCH_API_BASE_URL 之後才 import
+    port = free_port()
+    if kind == "flask":
+        from werkzeug.serving import make_server
+        from Controller import app
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # 不要每個請求印一行
+        server = make_server("127.0.0.1", port, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name="bench-backend", daemon=True).start()
+    else:
+        import uvicorn
+        from asgi import app
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, name="bench-backend", daemon=True).start()
+    wait_for_port(port)
+    return f"http://127.0.0.1:{port}"
+
+
+def clear_backend_caches():
+    # 只有同 process 的後端可以清除，讓每個 route 都從冷快取開始
+    from cache import CACHES
+    for cache in CACHES.values():
+        cache.clear()
+
+
+class MockStats:
+    def __init__(self, mock_url, state=None):
+        self.mock_url = mock_url
+        self.state = state
+
+    def reset(self):
+        if self.state is not None:
+            self.state.reset()
+        else:
+            requests.post(f"{self.mock_url}/__mock/reset", timeout=5)
+
+    def snapshot(self):
+        if self.state is not None:
+            return self.state.stats()
+        return requests.get(f"{self.mock_url}/__mock/stats", timeout=5).json()
+
+
+def run_phase(base_url, route, urls, concurrency):
+    local = threading.local()
+
+    def hit(path):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            res = session.get(base_url + path, timeout=120)
+            _ = res.content  # 串流 route 也要讀完整個 body
+            status = res.status_code
+            cache_status = res.headers.get("X-Cache")
+        except requests.RequestException:
+            status, cache_status = 0, None
+        return time.perf_counter() - started, status, cache_status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+        results = list(executor.map(hit, urls))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _, _ in results)
+    errors = sum(1 for _, status, _ in results if status == 0 or status >= 500)
+    cache_statuses = [cache_status for _, _, cache_status in results if cache_status]
+    return {
+        "route": route,
+        "requests": len(results),
+        "errors": errors,
+        "status": {str(s): sum(1 for _, status, _ in results if status == s) for s in sorted({r[1] for r in results})},
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "hit_ratio": round(cache_statuses.count("HIT") / len(cache_statuses), 3) if cache_statuses else None,
+    }
+
+
+def print_report(rows):
+    header = f"{'route':<22}{'reqs':>6}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'hit%':>7}{'upstream':>10}{'/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        hit = "-" if row["hit_ratio"] is None else f"{row['hit_ratio'] * 100:.0f}"
+        print(f"{row['route']:<22}{row['requests']:>6}{row['errors']:>5}{row['throughput_rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{hit:>7}"
+              f"{row['upstream_total']:>10}{row['upstream_per_request']:>7}")
+        print(f"{'':<22}upstream: {json.dumps(row['upstream_calls'], sort_keys=True)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="對後端各 route 施壓並統計延遲與上游呼叫次數")
+    parser.add_argument("--server", choices=("flask", "asgi", "external"), default="flask")
+    parser.add_argument("--target", help="--server external 時的後端位置，例如 http://127.0.0.1:5000")
+    parser.add_argument("--mock-url", help="--server external 時 mock_1inch 的位置 (用來讀取上游呼叫次數)")
+    parser.add_argument("--routes", default=",".join(SCENARIOS), help="逗號分隔，預設全部")
+    parser.add_argument("--requests", type=int, default=200, help="每個 route 的請求數")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--wallets", type=int, default=50, help="抽樣的錢包數 (越少快取命中越多)")
+    parser.add_argument("--bench-tokens", type=int, default=200, help="TokenInfo / Chart 抽樣的 token 數")
+    parser.add_argument("--warm", action="store_true", help="各 route 之間不清除後端快取")
+    parser.add_argument("--gas-poll", action="store_true", help="保留 gas 背景輪詢 (會計入上游呼叫次數)")
+    parser.add_argument("--json", dest="json_path", help="另外把結果寫成 JSON 檔")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    unknown = [route for route in routes if route not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知的 route：{', '.join(unknown)}，可用：{', '.join(SCENARIOS)}")
+
+    if args.server == "external":
+        if not args.target or not args.mock_url:
+            parser.error("--server external 需要 --target 與 --mock-url")
+        base_url = args.target.rstrip("/")
+        stats = MockStats(args.mock_url.rstrip("/"))
+    else:
+        mock_server, mock_state = start_mock_server(config_from_args(args))
+        os.environ["ONEINCH_API_BASE_URL"] = "http://%s:%d" % mock_server.server_address
+        os.environ.setdefault("1INCH_API_KEY", "mock")
+        if not args.gas_poll:
+            os.environ["GAS_POLL_ENABLED"] = "0"
+        base_url = start_backend(args.server)
+        stats = MockStats(None, mock_state)
+
+    print(f"server={args.server} requests/route={args.requests} concurrency={args.concurrency} "
+          f"wallets={args.wallets} tokens/wallet={args.tokens} latency={args.latency_ms}±{args.jitter_ms}ms "
+          f"UPSTREAM_MAX_RPS={os.getenv('UPSTREAM_MAX_RPS', '10')}", file=sys.stderr)
+
+    rows = []
+    for route in routes:
+        # 每個 route 用同一個 seed 產生請求序列，前後兩次 benchmark 可直接比較
+        ctx = ScenarioContext(args.seed, args.wallets, args.bench_tokens)
+        urls = [SCENARIOS[route](ctx) for _ in range(args.requests)]
+        if args.server != "external" and not args.warm:
+            clear_backend_caches()
+        stats.reset()
+        row = run_phase(base_url, route, urls, args.concurrency)
+        upstream = stats.snapshot()
+        row["upstream_calls"] = upstream["calls"]
+        row["upstream_total"] = upstream["total"]
+        row["upstream_per_request"] = round(upstream["total"] / row["requests"], 2)
+        rows.append(row)
+        print(f"done {route}", file=sys.stderr)
+
+    print_report(rows)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Prometheus 文字格式的指標，不依賴 prometheus_client
+# 注意：每個 worker process 各自統計，多 worker 部署時 Prometheus 需分別抓取或在前面加總
+import math
+import threading
+
+from cache import CACHES
+from rate_limiter import rate_limiter
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 所有已定義的指標與抓取時才計算的 collector (回傳 [(name, type, help, [(labels, value), ...]), ...])
+METRICS = []
+COLLECTORS = []
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # {label values tuple: value}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(tuple(zip(self.labelnames, labels)), value) for labels, value in items]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels):
+        self.add(1.0, *labels)
+
+    def add(self, amount, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + 1
+
+    def dec(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) - 1
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]  # [各桶計數, 總和, 次數]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        for labels, (counts, total, count) in items:
+            base = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(base + (('le', format_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(base)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(base)} {count}")
+        return lines
+
+
+# ---- route ----
+HTTP_REQUESTS = Counter("oneinch_http_requests_total", "Requests handled, by route, method and status",
+                        ("route", "method", "status"))
+HTTP_DURATION = Histogram("oneinch_http_request_duration_seconds",
+                          "Time until the response headers are ready, by route", ("route",))
+HTTP_IN_FLIGHT = Gauge("oneinch_http_requests_in_flight", "Requests currently being handled, by route", ("route",))
+
+# ---- 上游 1inch API ----
+UPSTREAM_DURATION = Histogram("oneinch_upstream_request_duration_seconds",
+                              "Duration of each upstream HTTP attempt, by API family", ("family",))
+UPSTREAM_RESPONSES = Counter("oneinch_upstream_responses_total",
+                             "Upstream attempts by API family and HTTP status (error = connection failure)",
+                             ("family", "status"))
+UPSTREAM_IN_FLIGHT = Gauge("oneinch_upstream_requests_in_flight", "Upstream HTTP attempts in progress",
+                           ("family",))
+UPSTREAM_BACKOFF = Counter("oneinch_upstream_backoff_seconds_total",
+                           "Time spent sleeping between upstream retries", ("family",))
+RATE_LIMIT_WAIT = Histogram("oneinch_rate_limiter_wait_seconds",
+                            "Time spent waiting for a rate limiter token before an upstream attempt",
+                            ("family", "priority"), buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+
+def register_collector(collector):
+    COLLECTORS.append(collector)
+    return collector
+
+
+@register_collector
+def collect_caches():
+    counters = ("hits", "stale_hits", "disk_hits", "misses", "evictions", "expirations", "refresh_errors")
+    gauges = ("entries", "bytes")
+    stats = {name: cache.stats() for name, cache in list(CACHES.items())}
+    families = []
+    for field in counters:
+        families.append((f"oneinch_cache_{field}_total", "counter", f"Cache {field.replace('_', ' ')}",
+                         [((("cache", name),), values[field]) for name, values in stats.items()]))
+    for field in gauges:
+        families.append((f"oneinch_cache_{field}", "gauge", f"Current cache {field}",
+                         [((("cache", name),), values[field]) for name, values in stats.items()]))
+    return families
+
+
+@register_collector
+def collect_rate_limiter():
+    snapshot = rate_limiter.snapshot()
+    return [
+        ("oneinch_rate_limiter_tokens", "gauge", "Tokens currently available in each bucket",
+         [((("bucket", name),), bucket["tokens"]) for name, bucket in snapshot.items()]),
+        ("oneinch_rate_limiter_waiting", "gauge", "Callers currently waiting for a token",
+         [((("bucket", name), ("priority", priority)), bucket[f"waiting_{priority}"])
+          for name, bucket in snapshot.items() for priority in ("interactive", "background")]),
+    ]
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        if isinstance(metric, Histogram):
+            lines.extend(metric.render())
+        else:
+            lines.extend(f"{metric.name}{format_labels(labels)} {format_value(value)}"
+                         for labels, value in metric.samples())
+    for collector in COLLECTORS:
+        for name, metric_type, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
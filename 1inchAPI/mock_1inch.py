@@ -0,0 +1,372 @@
+# 本地的 1inch API 替身，用來做壓力測試 / benchmark，不消耗真實的 API 額度
+# 只依賴標準函式庫：python mock_1inch.py --port 8099 --latency-ms 80 --tokens 50
+# 後端設定 ONEINCH_API_BASE_URL=http://127.0.0.1:8099 即可改打這個 server
+import argparse
+from collections import Counter
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# (route 名稱, path 規則)；route 名稱用於統計呼叫次數
+ROUTES = [
+    ("balance", re.compile(r"^/balance/v1\.2/(?P<chain>\d+)/balances/(?P<wallet>[^/]+)$")),
+    ("price", re.compile(r"^/price/v1\.1/(?P<chain>\d+)/?$")),
+    ("token-list", re.compile(r"^/token/v1\.2/(?P<chain>\d+)/?$")),
+    ("token-custom", re.compile(r"^/token/v1\.2/(?P<chain>\d+)/custom/(?P<token>[^/]+)$")),
+    ("charts-interval", re.compile(r"^/token-details/v1\.0/charts/interval/(?P<chain>\d+)(/(?P<token>[^/]+))?$")),
+    ("charts-range", re.compile(r"^/token-details/v1\.0/charts/range/(?P<chain>\d+)/(?P<token>[^/]+)$")),
+    ("orderbook-order", re.compile(r"^/orderbook/v4\.0/(?P<chain>\d+)/order/(?P<hash>[^/]+)$")),
+    ("orderbook-address", re.compile(r"^/orderbook/v4\.0/(?P<chain>\d+)/address/(?P<wallet>[^/]+)$")),
+    ("nft", re.compile(r"^/nft/v2/byaddress$")),
+    ("gas-price", re.compile(r"^/gas-price/v1\.5/(?P<chain>\d+)$")),
+]
+
+
+class MockConfig:
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, throttle_rate=0.0, max_rps=0.0,
+                 tokens=30, token_universe=2000, nfts=20, orders=20, seed=1):
+        self.latency_ms = latency_ms  # 每個回應的基本延遲
+        self.jitter_ms = jitter_ms  # 延遲的隨機浮動 (+/-)
+        self.error_rate = error_rate  # 隨機回 500 的比例
+        self.throttle_rate = throttle_rate  # 隨機回 429 的比例
+        self.max_rps = max_rps  # 超過每秒請求數就回 429 (0 表示不限制)，模擬 1inch 方案額度
+        self.tokens = tokens  # 每個合成錢包持有的 token 數量
+        self.token_universe = token_universe  # 所有錢包從這些 token 中抽樣，錢包之間會有重疊
+        self.nfts = nfts
+        self.orders = orders
+        self.seed = seed
+
+
+def stable_random(*parts):
+    # 依輸入產生固定的亂數產生器，同一個錢包 / token 每次都得到相同的資料
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def token_address(index):
+    return "0x" + hashlib.sha1(f"token-{index}".encode()).hexdigest()
+
+
+class MockState:
+    def __init__(self, config):
+        self.config = config
+        self.calls = Counter()
+        self.status_counts = Counter()
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._rng = random.Random(config.seed)
+        self.tokens = [token_address(i) for i in range(config.token_universe)]
+        self._token_index = {address: i for i, address in enumerate(self.tokens)}
+        # 前 90% 的 token 出現在 token 清單中且有報價，其餘模擬沒有報價的垃圾空投
+        self.listed_count = int(len(self.tokens) * 0.9)
+
+    def record(self, route, status):
+        with self._lock:
+            self.calls[route] += 1
+            self.status_counts[status] += 1
+
+    def over_limit(self):
+        # 固定 1 秒視窗的簡易限流
+        if not self.config.max_rps:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count > self.config.max_rps
+
+    def roll(self):
+        with self._lock:
+            return self._rng.random()
+
+    def delay(self):
+        with self._lock:
+            jitter = self._rng.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        return max(0.0, self.config.latency_ms + jitter) / 1000
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "total": sum(self.calls.values()),
+                    "status": {str(k): v for k, v in self.status_counts.items()}}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.status_counts.clear()
+
+    # ---- 合成資料 ----
+
+    def wallet_tokens(self, chain, wallet):
+        rng = stable_random("wallet", chain, wallet.lower())
+        count = min(self.config.tokens, len(self.tokens))
+        return rng.sample(self.tokens, count)
+
+    def token_info(self, chain, token):
+        index = self._token_index.get(token.lower())
+        if index is None:
+            return None
+        return {
+            "symbol": f"TK{index}",
+            "name": f"Mock Token {index}",
+            "address": token.lower(),
+            "chainId": int(chain),
+            "decimals": self.token_decimals(token),
+            "logoURI": f"https://tokens.example/{index}.png",
+        }
+
+    def token_decimals(self, token):
+        return stable_random("token", token.lower()).choice((6, 8, 18, 18, 18))
+
+    def token_price(self, token):
+        return stable_random("price", token.lower()).uniform(0.0001, 5000)
+
+    def balance(self, chain, wallet):
+        result = {}
+        for token in self.wallet_tokens(chain, wallet):
+            rng = stable_random("balance", wallet.lower(), token)
+            # 約 1/3 的 token 是 0 或極少量 (灰塵)
+            result[token] = str(rng.choice((0, rng.randint(1, 10 ** 6), rng.randint(10 ** 15, 10 ** 22))))
+        return result
+
+    def price(self, tokens):
+        priced = [token for token in tokens if self._token_index.get(token.lower(), self.listed_count) < self.listed_count]
+        return {"tokens": {token.lower(): {"price": f"{self.token_price(token):.8f}", "decimals": self.token_decimals(token)}
+                           for token in priced}}
+
+    def chart_points(self, token, start, end, step):
+        base = self.token_price(token or "native")
+        rng = stable_random("chart", token, start // step)
+        points = []
+        value = base
+        for t in range(start - start % step, end + 1, step):
+            value = max(value * (1 + rng.uniform(-0.01, 0.01)), 1e-9)
+            if t >= start:
+                points.append({"t": t, "v": round(value, 8)})
+        return {"data": points}
+
+    def orders(self, chain, wallet, limit, page=1):
+        # 每 30 秒約有 1/5 的訂單 remainingMakerAmount 變動 (部分成交)，讓增量同步看得到變化
+        bucket = int(time.time() // 30)
+        result = []
+        for i in range((page - 1) * limit, min(page * limit, self.config.orders)):
+            rng = stable_random("orders", chain, wallet.lower(), i)
+            filled = stable_random("fill", chain, wallet.lower(), i, bucket).randint(0, 10 ** 17) \
+                if (i + bucket) % 5 == 0 else 0
+            result.append({
+                "orderHash": "0x" + hashlib.sha256(f"{wallet}-{i}".encode()).hexdigest(),
+                "createDateTime": f"2025-04-0{1 + i % 9}T00:00:00Z",
+                "remainingMakerAmount": str(rng.randint(10 ** 17, 10 ** 18) - filled),
+                "makerBalance": str(rng.randint(1, 10 ** 18)),
+                "data": {"makerAsset": rng.choice(self.tokens), "takerAsset": rng.choice(self.tokens),
+                         "maker": wallet.lower(), "makingAmount": str(rng.randint(1, 10 ** 18)),
+                         "takingAmount": str(rng.randint(1, 10 ** 18))},
+            })
+        return result
+
+    def order_by_hash(self, chain, order_hash):
+        # 與真實的 /order/{hash} 相同，欄位比錢包清單中的訂單多 (狀態、id、最後變動時間等)
+        rng = stable_random("order", chain, order_hash.lower())
+        maker = token_address(rng.randint(1, 10 ** 6))
+        making_amount = rng.randint(10 ** 17, 10 ** 18)
+        taking_amount = rng.randint(1, 10 ** 18)
+        remaining = making_amount - rng.randint(0, making_amount // 2)
+        maker_asset, taker_asset = rng.choice(self.tokens), rng.choice(self.tokens)
+        return {
+            "id": rng.randint(1, 10 ** 7),
+            "orderHash": order_hash,
+            "createDateTime": "2025-04-01T00:00:00Z",
+            "lastChangedDateTime": "2025-04-02T00:00:00Z",
+            "orderStatus": rng.choice([1, 1, 1, 2, -1]),  # 1 有效、2 已成交、-1 已取消 / 過期
+            "orderInvalidReason": None,
+            "signature": "0x" + hashlib.sha256(f"sig-{order_hash}".encode()).hexdigest() * 2,
+            "makerAsset": maker_asset,
+            "takerAsset": taker_asset,
+            "makerAmount": str(making_amount),
+            "takerAmount": str(taking_amount),
+            "remainingMakerAmount": str(remaining),
+            "makerBalance": str(rng.randint(1, 10 ** 18)),
+            "makerAllowance": str(rng.randint(1, 10 ** 18)),
+            "makerRate": f"{taking_amount / making_amount:.18f}",
+            "takerRate": f"{making_amount / taking_amount:.18f}",
+            "isMakerContract": False,
+            "data": {"makerAsset": maker_asset, "takerAsset": taker_asset, "maker": maker,
+                     "receiver": "0x0000000000000000000000000000000000000000",
+                     "makingAmount": str(making_amount), "takingAmount": str(taking_amount),
+                     "salt": str(rng.randint(1, 10 ** 30)), "extension": "0x", "makerTraits": "0"},
+        }
+
+    def nfts(self, wallet, chain_ids):
+        assets = []
+        for chain in chain_ids:
+            rng = stable_random("nft", chain, wallet.lower())
+            for i in range(self.config.nfts):
+                collection = rng.randint(1, 50)
+                assets.append({
+                    "id": f"{chain}-{collection}-{i}",
+                    "chainId": int(chain),
+                    "token_id": str(rng.randint(1, 10 ** 6)),
+                    "name": f"Mock NFT #{i}",
+                    "image_url": f"https://nft.example/{chain}/{collection}/{i}.png",
+                    "asset_contract": {"address": token_address(10 ** 6 + collection), "name": f"Collection {collection}"},
+                })
+        return {"assets": assets}
+
+    def gas_price(self, chain):
+        # 每 10 秒變動一次，讓輪詢看得到變化
+        rng = stable_random("gas", chain, int(time.time() // 10))
+        base = rng.randint(5, 50) * 10 ** 9
+        tiers = {}
+        for tier, tip in (("low", 1), ("medium", 2), ("high", 3), ("instant", 5)):
+            tiers[tier] = {"maxPriorityFeePerGas": str(tip * 10 ** 9), "maxFeePerGas": str(base * 2 + tip * 10 ** 9)}
+        return dict(tiers, baseFee=str(base))
+
+    def respond(self, route, match, query):
+        # 回傳 (status, body)
+        chain = match.groupdict().get("chain")
+        if route == "balance":
+            return 200, self.balance(chain, match["wallet"])
+        if route == "price":
+            return 200, self.price(query.get("tokens", [""])[0].split(","))
+        if route == "token-list":
+            # 與真實 API 相同，清單中只有「知名」token (這裡取前 90%)，其餘只能逐一查詢
+            return 200, {token: self.token_info(chain, token) for token in self.tokens[:self.listed_count]}
+        if route == "token-custom":
+            info = self.token_info(chain, match["token"])
+            return (200, info) if info else (400, {"error": "Bad Request", "description": "token not found"})
+        if route == "charts-interval":
+            now = int(time.time())
+            return 200, self.chart_points(match["token"], now - 365 * 86400, now, 86400)
+        if route == "charts-range":
+            try:
+                start, end = int(query["from"][0]), int(query["to"][0])
+            except (KeyError, ValueError):
+                return 400, {"error": "from / to required"}
+            return 200, self.chart_points(match["token"], start, min(end, int(time.time())), 300)
+        if route == "orderbook-order":
+            return 200, self.order_by_hash(chain, match["hash"])
+        if route == "orderbook-address":
+            limit = int(query.get("limit", ["100"])[0])
+            return 200, self.orders(chain, match["wallet"], limit, int(query.get("page", ["1"])[0]))
+        if route == "nft":
+            chain_ids = query.get("chainIds") or ["1"]
+            chain_ids = [c for value in chain_ids for c in value.split(",")]
+            assets = self.nfts(query.get("address", [""])[0], chain_ids)["assets"]
+            if "limit" in query:
+                # 與真實 API 相同以 limit / offset 分頁
+                offset = int(query.get("offset", ["0"])[0])
+                assets = assets[offset:offset + int(query["limit"][0])]
+            return 200, {"assets": assets}
+        if route == "gas-price":
+            return 200, self.gas_price(chain)
+        return 404, {"error": "not found"}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive，與真實 API 的連線行為一致
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body, separators=(",", ":")).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/__mock/stats":
+                self.send_json(200, state.stats())
+                return
+
+            for route, pattern in ROUTES:
+                match = pattern.match(url.path)
+                if match:
+                    break
+            else:
+                state.record("unknown", 404)
+                self.send_json(404, {"error": "not found"})
+                return
+
+            time.sleep(state.delay())
+            config = state.config
+            if state.over_limit() or (config.throttle_rate and state.roll() < config.throttle_rate):
+                state.record(route, 429)
+                self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": "1"})
+                return
+            if config.error_rate and state.roll() < config.error_rate:
+                state.record(route, 500)
+                self.send_json(500, {"error": "Internal Server Error"})
+                return
+
+            status, body = state.respond(route, match, parse_qs(url.query))
+            state.record(route, status)
+            self.send_json(status, body)
+
+        def do_POST(self):
+            if urlparse(self.path).path == "/__mock/reset":
+                state.reset()
+                self.send_json(200, {"ok": True})
+                return
+            self.send_json(404, {"error": "not found"})
+
+    return Handler
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    # 在背景執行緒啟動，回傳 (server, state)；port=0 時自動挑選，實際位置見 server.server_address
+    state = MockState(config or MockConfig())
+    server = MockServer((host, port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name="mock-1inch", daemon=True).start()
+    return server, state
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="隨機回 500 的比例 (0~1)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="隨機回 429 的比例 (0~1)")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="超過就回 429，0 表示不限制")
+    parser.add_argument("--tokens", type=int, default=30, help="每個錢包的 token 數")
+    parser.add_argument("--token-universe", type=int, default=2000)
+    parser.add_argument("--nfts", type=int, default=20, help="每條鏈每個錢包的 NFT 數")
+    parser.add_argument("--orders", type=int, default=20, help="每個錢包的掛單數")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def config_from_args(args):
+    return MockConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.max_rps,
+                      args.tokens, args.token_universe, args.nfts, args.orders, args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地的 1inch API 替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server, _ = start_mock_server(config_from_args(args), args.host, args.port)
+    print(f"mock 1inch API: http://{args.host}:{args.port}  (統計: GET /__mock/stats，歸零: POST /__mock/reset)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
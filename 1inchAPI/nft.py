@@ -0,0 +1,213 @@
+# NFT：各鏈分頁並行抓取、依到達順序串流，錢包的 NFT 清單與 collection metadata 分開快取
+from concurrent.futures import FIRST_COMPLETED, wait
+import contextlib
+import logging
+import os
+import queue
+import threading
+
+from cache import TTLCache
+from concurrency import fanout_executor, submit_with_context, upstream_executor
+from disk_cache import disk_cache
+from rate_limiter import PRIORITY_INTERACTIVE
+import upstream
+from upstream import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+# 預設查詢的鏈 (原本寫死在 get_NFTs 中)
+NFT_CHAIN_IDS = [chain_id.strip() for chain_id in os.getenv("NFT_CHAIN_IDS", "1,137,8453,42161,8217,43114,10").split(",")
+                 if chain_id.strip()]
+NFT_PAGE_SIZE = int(os.getenv("NFT_PAGE_SIZE", "50"))
+NFT_PAGE_CONCURRENCY = int(os.getenv("NFT_PAGE_CONCURRENCY", "3"))  # 每條鏈同時抓幾頁
+NFT_MAX_PAGES = int(os.getenv("NFT_MAX_PAGES", "100"))  # 每條鏈最多抓幾頁，避免異常回應造成無限翻頁
+NFT_CACHE_TTL_SECONDS = int(os.getenv("NFT_CACHE_TTL_SECONDS", "600"))
+NFT_CACHE_MAX_ENTRIES = int(os.getenv("NFT_CACHE_MAX_ENTRIES", "5000"))
+NFT_CACHE_MAX_BYTES = int(os.getenv("NFT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# collection 的名稱、圖片等幾乎不會變
+NFT_COLLECTION_TTL_SECONDS = int(os.getenv("NFT_COLLECTION_TTL_SECONDS", str(24 * 3600)))
+NFT_COLLECTION_MAX_ENTRIES = int(os.getenv("NFT_COLLECTION_MAX_ENTRIES", "50000"))
+
+# 格式: { (chain_id, wallet 小寫): [asset, ...] }；asset 不含 asset_contract，只留 contract 位址
+nft_listing_cache = TTLCache("nft_listing", NFT_CACHE_MAX_ENTRIES, NFT_CACHE_TTL_SECONDS,
+                             max_bytes=NFT_CACHE_MAX_BYTES, backing=disk_cache)
+# 格式: { (chain_id, contract 小寫): asset_contract dict }，同一個 collection 的 NFT 共用一份
+nft_collection_cache = TTLCache("nft_collection", NFT_COLLECTION_MAX_ENTRIES, NFT_COLLECTION_TTL_SECONDS,
+                                backing=disk_cache)
+
+
+def listing_key(chain_id, wallet_address):
+    return str(chain_id), wallet_address.lower()
+
+
+def nft_page_request(chain_id, wallet_address, page):
+    params = {"chainIds": chain_id, "address": wallet_address, "limit": NFT_PAGE_SIZE, "offset": page * NFT_PAGE_SIZE}
+    return "nft", "/nft/v2/byaddress", params
+
+
+def fetch_nft_page(chain_id, wallet_address, page, priority=PRIORITY_INTERACTIVE):
+    raw_res = upstream.get_json(*nft_page_request(chain_id, wallet_address, page), priority=priority)
+    assets = raw_res.get("assets") if isinstance(raw_res, dict) else None
+    return assets if isinstance(assets, list) else []
+
+
+def iter_nft_pages(chain_id, wallet_address, priority=PRIORITY_INTERACTIVE):
+    # 逐頁產生 (page, items)，依完成先後順序；同時最多 NFT_PAGE_CONCURRENCY 頁在查詢中
+    # 總頁數事先不知道：某一頁不滿 NFT_PAGE_SIZE 就是最後一頁，之後不再送出新的頁
+    futures = {}
+    next_page = 0
+    last_page = None
+
+    def submit():
+        nonlocal next_page
+        future = submit_with_context(upstream_executor, fetch_nft_page, chain_id, wallet_address, next_page, priority)
+        futures[future] = next_page
+        next_page += 1
+
+    try:
+        while True:
+            while len(futures) < NFT_PAGE_CONCURRENCY and last_page is None and next_page < NFT_MAX_PAGES:
+                submit()
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = futures.pop(future)
+                items = future.result()
+                if len(items) < NFT_PAGE_SIZE:
+                    last_page = page if last_page is None else min(last_page, page)
+                if items:
+                    yield page, items
+    finally:
+        # 呼叫端中途停止或出錯時，取消尚未開始的頁
+        for future in futures:
+            future.cancel()
+
+
+def remember_collection(chain_id, contract, contract_info):
+    key = (str(chain_id), contract)
+    if nft_collection_cache.peek(key) is None:
+        nft_collection_cache.set(key, contract_info)
+
+
+def compact_asset(chain_id, item):
+    # asset_contract 移到 collection 快取，asset 只留 contract 位址；其他欄位原樣保留
+    contract_info = item.get("asset_contract")
+    contract = ""
+    if isinstance(contract_info, dict):
+        contract = (contract_info.get("address") or "").lower()
+        if contract:
+            remember_collection(chain_id, contract, contract_info)
+    asset = {name: value for name, value in item.items() if name != "asset_contract"}
+    asset["chain_id"] = str(chain_id)
+    asset["contract"] = contract
+    return asset
+
+
+def asset_key(asset):
+    # 同名的 NFT 很常見，以 (鏈, contract, token_id) 區分
+    token_id = asset.get("token_id")
+    if token_id is None:
+        token_id = asset.get("id")
+    return f"{asset.get('chain_id')}:{asset.get('contract')}:{token_id}"
+
+
+def collections_for(assets, known=None):
+    # 回傳 assets 用到的 collection metadata { "chain_id:contract": info }；known 中已有的略過
+    result = {}
+    for asset in assets:
+        chain_id, contract = asset.get("chain_id"), asset.get("contract")
+        name = f"{chain_id}:{contract}"
+        if not contract or name in result or (known is not None and name in known):
+            continue
+        result[name] = nft_collection_cache.get((chain_id, contract)) or {"address": contract}
+    return result
+
+
+def iter_nft_events(wallet_address, chain_ids, priority=PRIORITY_INTERACTIVE):
+    # 依到達先後產生事件：
+    #   ("assets", chain_id, [asset, ...])
+    #   ("done", chain_id, cache_status, age, listing)  每條鏈一次；listing 為依頁碼排序的完整清單
+    #   ("error", chain_id, error dict)                 該鏈失敗 (不會再有 done)
+    # 快取命中的鏈最先給，其餘各鏈同時查詢，查完整條鏈才寫入快取
+    pending_chains = []
+    for chain_id in chain_ids:
+        entry = nft_listing_cache.get_entry(listing_key(chain_id, wallet_address))
+        if entry is None:
+            pending_chains.append(chain_id)
+            continue
+        listing, age = entry
+        if listing:
+            yield "assets", chain_id, listing
+        yield "done", chain_id, "HIT", age, listing
+    if not pending_chains:
+        return
+
+    events = queue.Queue()
+    stopped = threading.Event()
+
+    def load_chain(chain_id):
+        # 每條鏈最後一定放入一筆 done 或 error，讀取端以此計數
+        listing = []
+        seen = set()
+        try:
+            with contextlib.closing(iter_nft_pages(chain_id, wallet_address, priority)) as pages:
+                for page, items in pages:
+                    if stopped.is_set():
+                        return
+                    assets = []
+                    for item in items:
+                        if not isinstance(item, dict):
+                            continue
+                        asset = compact_asset(chain_id, item)
+                        key = asset_key(asset)
+                        if key not in seen:  # 翻頁期間資料變動可能造成重複
+                            seen.add(key)
+                            assets.append((page, asset))
+                    listing.extend(assets)
+                    events.put(("assets", chain_id, [asset for _, asset in assets]))
+        except UpstreamError as error:
+            events.put(("error", chain_id, error.to_dict()))
+            return
+        except Exception:
+            logger.exception("取得 NFT 時發生未預期錯誤 (chain %s)", chain_id)
+            events.put(("error", chain_id, {"error": "取得 NFT 時發生異常"}))
+            return
+        # 頁面完成順序不固定，寫入快取前依頁碼排回原本順序
+        listing.sort(key=lambda item: item[0])
+        ordered = [asset for _, asset in listing]
+        nft_listing_cache.set(listing_key(chain_id, wallet_address), ordered)
+        events.put(("done", chain_id, "MISS", 0.0, ordered))
+
+    for chain_id in pending_chains:
+        submit_with_context(fanout_executor, load_chain, chain_id)
+
+    remaining = len(pending_chains)
+    try:
+        while remaining:
+            event = events.get()
+            if event[0] in ("done", "error"):
+                remaining -= 1
+            yield event
+    finally:
+        stopped.set()
+
+
+def load_nft_assets(wallet_address, chain_ids, priority=PRIORITY_INTERACTIVE):
+    # 收集所有事件，回傳 ({chain_id: [asset, ...]}, {chain_id: error dict}, age, cache_status)
+    assets = {}
+    errors = {}
+    max_age = 0.0
+    cache_statuses = set()
+    for event in iter_nft_events(wallet_address, chain_ids, priority):
+        if event[0] == "done":
+            _, chain_id, cache_status, age, listing = event
+            assets[chain_id] = listing
+            cache_statuses.add(cache_status)
+            max_age = max(max_age, age)
+        elif event[0] == "error":
+            errors[event[1]] = event[2]
+    # 依查詢時的鏈順序排列
+    assets = {chain_id: assets[chain_id] for chain_id in chain_ids if chain_id in assets}
+    cache_status = "HIT" if cache_statuses == {"HIT"} else "MISS"
+    return assets, errors, max_age, cache_status
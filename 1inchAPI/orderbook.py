@@ -0,0 +1,235 @@
+# OrderBook：錢包訂單的 cursor 分頁，以及每個 (chain, wallet) 的本地訂單索引
+# 索引用於增量同步 (只回傳 cursor 之後新增 / 變動 / 移除的訂單)；by-hash 查詢另有自己的快取
+import base64
+import binascii
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+import uuid
+
+from cache import TTLCache
+from rate_limiter import PRIORITY_INTERACTIVE
+from singleflight import SingleFlight
+import upstream
+
+ORDERBOOK_DEFAULT_LIMIT = int(os.getenv("ORDERBOOK_DEFAULT_LIMIT", "5"))  # 未指定 limit 時 (與原本寫死的值相同)
+ORDERBOOK_MAX_LIMIT = int(os.getenv("ORDERBOOK_MAX_LIMIT", "500"))  # 1inch 單頁上限
+# 同步時索引超過幾秒沒有完整更新才重新向上游抓取，同一錢包的多個 dashboard 共用同一次抓取
+ORDERBOOK_SYNC_INTERVAL_SECONDS = float(os.getenv("ORDERBOOK_SYNC_INTERVAL_SECONDS", "5"))
+ORDERBOOK_SYNC_MAX_PAGES = int(os.getenv("ORDERBOOK_SYNC_MAX_PAGES", "20"))
+# by-hash 查詢結果的快取秒數；/order/{hash} 與錢包清單的格式不同，兩者分開存放
+ORDERBOOK_HASH_MAX_AGE_SECONDS = int(os.getenv("ORDERBOOK_HASH_MAX_AGE_SECONDS", "30"))
+ORDERBOOK_HASH_MAX_ENTRIES = int(os.getenv("ORDERBOOK_HASH_MAX_ENTRIES", "10000"))
+ORDERBOOK_INDEX_TTL_SECONDS = int(os.getenv("ORDERBOOK_INDEX_TTL_SECONDS", "3600"))
+ORDERBOOK_INDEX_MAX_ENTRIES = int(os.getenv("ORDERBOOK_INDEX_MAX_ENTRIES", "2000"))
+# 每個索引保留多少筆「已移除」紀錄；cursor 比最舊的紀錄還舊時改回傳完整清單
+ORDERBOOK_TOMBSTONE_KEEP = int(os.getenv("ORDERBOOK_TOMBSTONE_KEEP", "1000"))
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(data):
+    # cursor 對前端是不透明的字串
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(text):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)))
+    except (binascii.Error, ValueError):
+        raise CursorError(f"無效的 cursor：{text}")
+    if not isinstance(data, dict):
+        raise CursorError(f"無效的 cursor：{text}")
+    return data
+
+
+def orderbook_hash_request(chain_id, hash_address):
+    return "orderbook", f"/orderbook/v4.0/{chain_id}/order/{hash_address}", None
+
+
+def orderbook_wallet_request(chain_id, wallet_address, limit=ORDERBOOK_DEFAULT_LIMIT, page=1):
+    params = {
+        "limit": str(limit),
+        "page": str(page),
+    }
+    return "orderbook", f"/orderbook/v4.0/{chain_id}/address/{wallet_address}", params
+
+
+def parse_page_args(args):
+    # 由 ?limit=&cursor= 取得 (limit, page)；cursor 中記錄的 limit 優先，翻頁時每頁大小不變
+    cursor = args.get("cursor")
+    if cursor:
+        data = decode_cursor(cursor)
+        limit, page = data.get("l"), data.get("p")
+    else:
+        limit, page = args.get("limit", ORDERBOOK_DEFAULT_LIMIT), 1
+    try:
+        limit, page = int(limit), int(page)
+    except (TypeError, ValueError):
+        raise CursorError("limit 必須是整數")
+    if not 1 <= limit <= ORDERBOOK_MAX_LIMIT or page < 1:
+        raise CursorError(f"limit 必須介於 1 ~ {ORDERBOOK_MAX_LIMIT}")
+    return limit, page
+
+
+def next_page_cursor(orders, limit, page):
+    # 這一頁是滿的才可能還有下一頁
+    if isinstance(orders, list) and len(orders) >= limit:
+        return encode_cursor({"l": limit, "p": page + 1})
+    return None
+
+
+def order_hash(order):
+    value = order.get("orderHash") if isinstance(order, dict) else None
+    return value.lower() if isinstance(value, str) else None
+
+
+class OrderIndex:
+    # 單一錢包的訂單 { orderHash: [seq, order, seen_at] }；每次新增或內容變動就配一個新的 seq
+    # epoch 在索引建立時產生，索引被淘汰或 process 重啟後舊的 cursor 就會失效
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.orders = {}
+        self.removed = OrderedDict()  # { orderHash: seq }，依 seq 由舊到新
+        self.removed_floor = 0  # 已丟棄的移除紀錄中最大的 seq
+        self.synced_at = None  # 最近一次完整同步的時間
+        self.lock = threading.Lock()
+
+    def upsert(self, orders, now):
+        # 部分資料 (單頁)：只新增 / 更新，不判斷移除；回傳本次出現的 orderHash
+        present = set()
+        for order in orders:
+            key = order_hash(order)
+            if key is None:
+                continue
+            present.add(key)
+            entry = self.orders.get(key)
+            if entry is not None and entry[1] == order:
+                entry[2] = now
+                continue
+            self.seq += 1
+            self.orders[key] = [self.seq, order, now]
+            self.removed.pop(key, None)
+        return present
+
+    def replace(self, orders, now):
+        # 完整清單：不在清單中的訂單視為已移除 (成交、取消或過期)
+        present = self.upsert(orders, now)
+        for key in [key for key in self.orders if key not in present]:
+            del self.orders[key]
+            self.seq += 1
+            self.removed[key] = self.seq
+        while len(self.removed) > ORDERBOOK_TOMBSTONE_KEEP:
+            _, self.removed_floor = self.removed.popitem(last=False)
+        self.synced_at = now
+
+    def cursor(self):
+        return encode_cursor({"e": self.epoch, "s": self.seq})
+
+    def changes_since(self, cursor):
+        # 回傳 (是否為完整清單, 變動的訂單, 移除的 orderHash)
+        since = None
+        if cursor:
+            data = decode_cursor(cursor)
+            if data.get("e") == self.epoch and isinstance(data.get("s"), int) and data["s"] >= self.removed_floor:
+                since = data["s"]
+        if since is None:
+            entries = sorted(self.orders.values(), key=lambda entry: entry[0])
+            return True, [entry[1] for entry in entries], []
+        entries = sorted((entry for entry in self.orders.values() if entry[0] > since), key=lambda entry: entry[0])
+        return False, [entry[1] for entry in entries], [key for key, seq in self.removed.items() if seq > since]
+
+
+# 格式: { (chain_id, wallet 小寫): OrderIndex }
+orderbook_indexes = TTLCache("orderbook_index", ORDERBOOK_INDEX_MAX_ENTRIES, ORDERBOOK_INDEX_TTL_SECONDS)
+# 格式: { (chain_id, orderHash 小寫): /order/{hash} 的回應 }
+order_hash_cache = TTLCache("orderbook_hash", ORDERBOOK_HASH_MAX_ENTRIES, ORDERBOOK_HASH_MAX_AGE_SECONDS)
+_index_lock = threading.Lock()
+# 同一錢包的完整同步同時只跑一次
+sync_flight = SingleFlight()
+
+
+def index_key(chain_id, wallet_address):
+    return str(chain_id), wallet_address.lower()
+
+
+def get_index(chain_id, wallet_address):
+    # 取得 (必要時建立) 錢包的索引，並延長其 TTL
+    key = index_key(chain_id, wallet_address)
+    with _index_lock:
+        index = orderbook_indexes.peek(key)
+        if index is None:
+            index = OrderIndex()
+        orderbook_indexes.set(key, index)
+    return index
+
+
+def record_orders(chain_id, wallet_address, orders, complete=False):
+    # 把上游回傳的訂單寫入索引；complete=True 表示這是錢包的完整清單
+    if not isinstance(orders, list):
+        return None
+    index = get_index(chain_id, wallet_address)
+    with index.lock:
+        if complete:
+            index.replace(orders, time.time())
+        else:
+            index.upsert(orders, time.time())
+    return index
+
+
+def hash_key(chain_id, hash_address):
+    return str(chain_id), hash_address.lower()
+
+
+def record_order(chain_id, hash_address, order):
+    # by-hash 查詢的結果只寫入 order_hash_cache，不寫入錢包索引 (格式不同，且可能已成交 / 取消)
+    if isinstance(order, dict):
+        order_hash_cache.set(hash_key(chain_id, hash_address), order)
+
+
+def lookup_order(chain_id, hash_address):
+    # 回傳快取中的 (order, age)；沒有或已過期時回傳 None
+    return order_hash_cache.get_entry(hash_key(chain_id, hash_address))
+
+
+def refresh_index(chain_id, wallet_address, priority=PRIORITY_INTERACTIVE):
+    # 逐頁抓取錢包的所有訂單；超過 ORDERBOOK_SYNC_MAX_PAGES 頁時只更新、不判斷移除
+    orders = []
+    for page in range(1, ORDERBOOK_SYNC_MAX_PAGES + 1):
+        page_orders = upstream.get_json(*orderbook_wallet_request(chain_id, wallet_address, ORDERBOOK_MAX_LIMIT, page),
+                                        priority=priority)
+        if not isinstance(page_orders, list):
+            break
+        orders.extend(page_orders)
+        if len(page_orders) < ORDERBOOK_MAX_LIMIT:
+            return record_orders(chain_id, wallet_address, orders, complete=True)
+    index = record_orders(chain_id, wallet_address, orders)
+    index.synced_at = time.time()
+    return index
+
+
+def sync_wallet_orders(chain_id, wallet_address, cursor=None, priority=PRIORITY_INTERACTIVE):
+    # 增量同步：回傳 cursor 之後新增 / 變動的訂單與移除的 orderHash，以及新的 cursor
+    # 沒有 cursor 或 cursor 已失效 (索引重建、移除紀錄已被丟棄) 時回傳完整清單 (full=True)
+    if cursor:
+        decode_cursor(cursor)  # 格式錯誤時先拋出，不打上游
+    index = get_index(chain_id, wallet_address)
+    if index.synced_at is None or time.time() - index.synced_at >= ORDERBOOK_SYNC_INTERVAL_SECONDS:
+        index = sync_flight.do(index_key(chain_id, wallet_address),
+                               lambda: refresh_index(chain_id, wallet_address, priority))
+    with index.lock:
+        full, orders, removed = index.changes_since(cursor)
+        return {
+            "cursor": index.cursor(),
+            "full": full,
+            "orders": orders,
+            "removed": removed,
+            "total": len(index.orders),
+            "synced_at": index.synced_at,
+        }
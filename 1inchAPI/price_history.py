@@ -0,0 +1,149 @@
+from array import array
+from bisect import bisect_left, bisect_right
+import os
+import threading
+import time
+
+from cache import TTLCache
+from concurrency import fetch_concurrently
+from singleflight import SingleFlight
+import upstream
+
+# 最近這段時間內的歷史價格可能還會補資料，不標記為「已涵蓋」，下次查詢會重新抓
+HISTORY_FRESHNESS_LAG_SECONDS = int(os.getenv("HISTORY_FRESHNESS_LAG_SECONDS", "300"))
+HISTORY_MAX_SERIES = int(os.getenv("HISTORY_MAX_SERIES", "2000"))
+HISTORY_SERIES_TTL_SECONDS = int(os.getenv("HISTORY_SERIES_TTL_SECONDS", str(24 * 3600)))
+# 每個 token 最多保留幾個點 (每點 16 bytes)；超過時丟掉離這次查詢較遠那一端的資料
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "20000"))
+
+
+def subtract_intervals(intervals, start, end):
+    # 回傳 [start, end] 中尚未被 intervals (已排序、不重疊的閉區間) 涵蓋的區段
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in intervals:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start - 1))
+        cursor = max(cursor, covered_end + 1)
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def add_interval(intervals, start, end):
+    # 插入 [start, end] 並合併相鄰 / 重疊的區間，回傳新的 list
+    merged = []
+    for covered_start, covered_end in sorted(intervals + [(start, end)]):
+        if merged and covered_start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], covered_end))
+        else:
+            merged.append((covered_start, covered_end))
+    return merged
+
+
+def clip_intervals(intervals, start, end):
+    # 只保留 intervals 落在 [start, end] 內的部分
+    return [(max(covered_start, start), min(covered_end, end)) for covered_start, covered_end in intervals
+            if covered_end >= start and covered_start <= end]
+
+
+class PriceSeries:
+    # 單一 (chain_id, token) 的時間序列：時間與價格分別存在連續的 array 中，方便用 bisect 切片
+    def __init__(self):
+        self.times = array("q")
+        self.values = array("d")
+        self.covered = []  # 已向上游取得過的時間區間 [(start, end), ...]
+        self.lock = threading.Lock()
+
+    def merge_points(self, points):
+        # points: [(t, v), ...]，已排序；與現有資料合併 (相同時間以新資料為準)
+        if not points:
+            return
+        if not self.times or points[0][0] > self.times[-1]:
+            # 最常見的情況：視窗往後滑動，直接接在尾端
+            self.times.extend(t for t, _ in points)
+            self.values.extend(v for _, v in points)
+            return
+        merged = dict(zip(self.times, self.values))
+        merged.update(points)
+        ordered = sorted(merged.items())
+        self.times = array("q", (t for t, _ in ordered))
+        self.values = array("d", (v for _, v in ordered))
+
+    def trim(self, keep_start, keep_end):
+        # 超過 HISTORY_MAX_POINTS 時，從離 [keep_start, keep_end] 較遠的一端丟掉資料，並縮小已涵蓋的區間
+        excess = len(self.times) - max(HISTORY_MAX_POINTS, 1)
+        if excess <= 0:
+            return
+        if keep_start - self.times[0] >= self.times[-1] - keep_end:
+            del self.times[:excess]
+            del self.values[:excess]
+        else:
+            del self.times[-excess:]
+            del self.values[-excess:]
+        self.covered = clip_intervals(self.covered, self.times[0], self.times[-1])
+
+    def slice(self, start, end):
+        lo = bisect_left(self.times, start)
+        hi = bisect_right(self.times, end)
+        return self.times[lo:hi], self.values[lo:hi]
+
+
+# 格式: { (chain_id, token_address 小寫): PriceSeries }
+price_series_cache = TTLCache("price_history", HISTORY_MAX_SERIES, HISTORY_SERIES_TTL_SECONDS)
+
+
+def parse_points(range_res):
+    # 上游格式: {"data": [{"t": 1743844261, "v": 0.0001}, ...]}
+    points = []
+    data = range_res.get("data", []) if isinstance(range_res, dict) else []
+    for item in data:
+        try:
+            points.append((int(item["t"]), float(item["v"])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    points.sort()
+    return points
+
+
+def fetch_range(chain_id, token_address, start, end):
+    range_res = upstream.get_json("charts", f"/token-details/v1.0/charts/range/{chain_id}/{token_address}",
+                                  {"from": f"{start}", "to": f"{end}"})
+    return parse_points(range_res)
+
+
+# 同一 token 的同一段缺口同時只向上游抓一次
+history_flight = SingleFlight()
+
+
+def get_price_history(chain_id, token_address, time_from, time_to):
+    # 只向上游抓尚未涵蓋的時間區段，合併後從本地資料切出 [time_from, time_to]
+    # 回傳 ({"data": [{"t":..., "v":...}, ...]}, 這次抓了幾段)
+    # 向上游抓取時不持有 series.lock，同一 token 已涵蓋範圍的查詢不必等待
+    key = (chain_id, token_address.lower())
+    series = price_series_cache.get_or_load(key, PriceSeries)
+
+    with series.lock:
+        gaps = subtract_intervals(series.covered, time_from, time_to)
+    fetched = {}
+    if gaps:
+        fetched = fetch_concurrently(
+            lambda gap: history_flight.do(key + gap, lambda: fetch_range(chain_id, token_address, gap[0], gap[1])),
+            gaps)
+
+    with series.lock:
+        settled_until = int(time.time()) - HISTORY_FRESHNESS_LAG_SECONDS
+        for (gap_start, gap_end), points in sorted(fetched.items()):
+            series.merge_points(points)
+            if gap_start <= settled_until:
+                series.covered = add_interval(series.covered, gap_start, min(gap_end, settled_until))
+        times, values = series.slice(time_from, time_to)
+        series.trim(time_from, time_to)
+
+    return {"data": [{"t": t, "v": v} for t, v in zip(times, values)]}, len(gaps)
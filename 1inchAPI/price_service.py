@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import Future
+import os
+import threading
+
+from cache import TTLCache
+from concurrency import fetch_concurrently
+from rate_limiter import PRIORITY_INTERACTIVE
+from tracing import span
+import upstream
+
+# 價格變動快，TTL 要短；同一個 TTL 內所有錢包共用同一份報價
+PRICE_CACHE_TTL_SECONDS = int(os.getenv("PRICE_CACHE_TTL_SECONDS", "30"))
+PRICE_CACHE_MAX_ENTRIES = int(os.getenv("PRICE_CACHE_MAX_ENTRIES", "100000"))
+# 單次 /price 請求最多帶幾個 token，避免 query string 超過 URL 長度限制 (100 個約 4.3 KB)
+PRICE_BATCH_SIZE = int(os.getenv("PRICE_BATCH_SIZE", "100"))
+
+# 格式: { (chain_id, token_address 小寫): price info dict }；上游沒有報價的 token 存空 dict，同樣不會重查
+token_price_cache = TTLCache("token_price", PRICE_CACHE_MAX_ENTRIES, PRICE_CACHE_TTL_SECONDS)
+
+# 正在向上游查詢的價格 { (chain_id, token_address 小寫): Future }，同時查同一個 token 的請求共用一次查詢
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def price_key(chain_id, token_address):
+    return str(chain_id), token_address.lower()
+
+
+def token_price_request(chain_id, token_addresses):
+    # 一次查詢多個 Token 的價格
+    return "price", f"/price/v1.1/{chain_id}/", {"tokens": ",".join(token_addresses)}
+
+
+def token_price_map_from(price_res):
+    if isinstance(price_res, dict) and isinstance(price_res.get("tokens"), dict):
+        return {token_addr.lower(): info for token_addr, info in price_res["tokens"].items()}
+    return {}
+
+
+def chunked(items, size):
+    return [tuple(items[i:i + size]) for i in range(0, len(items), max(size, 1))]
+
+
+def claim_prices(chain_id, token_addresses):
+    # 回傳 (快取中的 {address: info}, 要由自己查詢的 [address], 其他請求正在查詢的 {address: Future})
+    result = {}
+    missing = []
+    claimed = []
+    waiting = {}
+    with span("cache.token_price", tokens=len(token_addresses)) as current:
+        for token_addr in dict.fromkeys(token_addr.lower() for token_addr in token_addresses):
+            info = token_price_cache.get(price_key(chain_id, token_addr))
+            if info is None:
+                missing.append(token_addr)
+            else:
+                result[token_addr] = info
+
+        with _pending_lock:
+            for token_addr in missing:
+                key = price_key(chain_id, token_addr)
+                future = _pending.get(key)
+                if future is None:
+                    _pending[key] = Future()
+                    claimed.append(token_addr)
+                else:
+                    waiting[token_addr] = future
+        if current is not None:
+            current.attrs.update(missing=len(claimed), waiting=len(waiting))
+    return result, claimed, waiting
+
+
+def release_prices(chain_id, chunk):
+    with _pending_lock:
+        return [(token_addr, _pending.pop(price_key(chain_id, token_addr), None)) for token_addr in chunk]
+
+
+def store_prices(chain_id, chunk, price_res):
+    # 把一批查詢結果寫入快取並通知等待中的請求，回傳 {address: info}
+    prices = token_price_map_from(price_res)
+    result = {}
+    for token_addr in chunk:
+        info = prices.get(token_addr)
+        result[token_addr] = info if isinstance(info, dict) else {}
+        token_price_cache.set(price_key(chain_id, token_addr), result[token_addr])
+    for token_addr, future in release_prices(chain_id, chunk):
+        if future is not None:
+            future.set_result(result[token_addr])
+    return result
+
+
+def fail_prices(chain_id, chunk, error):
+    # 查詢失敗時，等待同一批 token 的請求也拋出同樣的錯誤 (不寫入快取，下次重查)
+    for _, future in release_prices(chain_id, chunk):
+        if future is not None:
+            future.set_exception(error)
+
+
+def get_token_prices(chain_id, token_addresses, priority=PRIORITY_INTERACTIVE):
+    # 回傳 {token_address 小寫: price info}，沒有報價的 token 為空 dict
+    # 只有快取中沒有、也沒有其他請求正在查的 token 才打上游，每批最多 PRICE_BATCH_SIZE 個並行查詢
+    result, claimed, waiting = claim_prices(chain_id, token_addresses)
+
+    def load(chunk):
+        try:
+            price_res = upstream.get_json(*token_price_request(chain_id, chunk), priority=priority)
+        except BaseException as error:
+            fail_prices(chain_id, chunk, error)
+            raise
+        return store_prices(chain_id, chunk, price_res)
+
+    chunks = chunked(claimed, PRICE_BATCH_SIZE)
+    if len(chunks) == 1:
+        result.update(load(chunks[0]))
+    elif chunks:
+        for prices in fetch_concurrently(load, chunks).values():
+            result.update(prices)
+
+    for token_addr, future in waiting.items():
+        result[token_addr] = future.result()
+    return result
+
+
+async def get_token_prices_async(chain_id, token_addresses, priority=PRIORITY_INTERACTIVE):
+    # get_token_prices 的 ASGI 版本；與同步版本共用快取與進行中的查詢
+    result, claimed, waiting = claim_prices(chain_id, token_addresses)
+
+    async def load(chunk):
+        try:
+            price_res = await upstream.get_json_async(*token_price_request(chain_id, chunk), priority=priority)
+        except BaseException as error:
+            fail_prices(chain_id, chunk, error)
+            raise
+        return store_prices(chain_id, chunk, price_res)
+
+    for prices in await asyncio.gather(*(load(chunk) for chunk in chunked(claimed, PRICE_BATCH_SIZE))):
+        result.update(prices)
+
+    for token_addr, future in waiting.items():
+        result[token_addr] = await asyncio.wrap_future(future)
+    return result
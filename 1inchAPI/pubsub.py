@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+from concurrency import fetch_concurrently, push_executor
+
+logger = logging.getLogger(__name__)
+
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "100"))  # 每個訂閱者最多積壓幾則訊息
+# 同時連線的訂閱者上限，每個訂閱者都佔用一條連線 (WSGI 模式下還佔用一個執行緒)
+PUSH_MAX_SUBSCRIBERS = int(os.getenv("PUSH_MAX_SUBSCRIBERS", "1000"))
+PUSH_TICK_SECONDS = 1.0
+
+_MISSING = object()
+
+
+def topic_name(topic):
+    # ("wallet", "1", "0xabc") -> "wallet:1:0xabc"
+    return ":".join(topic)
+
+
+def diff_values(old, new):
+    # 計算兩次結果的差異；dict 只回傳變動 / 新增的 key 與被移除的 key，沒有變化時回傳 None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {key: value for key, value in new.items() if old.get(key, _MISSING) != value}
+        removed = [key for key in old if key not in new]
+        if not changed and not removed:
+            return None
+        return {"set": changed, "removed": removed}
+    if old == new:
+        return None
+    return {"replace": new}
+
+
+class Subscription:
+    def __init__(self, topics):
+        self.topics = topics
+        self.queue = queue.Queue(maxsize=PUSH_QUEUE_SIZE)
+        self.overflowed = False  # 消化太慢被踢掉時為 True，前端應重新連線
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+
+class AsyncSubscription(Subscription):
+    # ASGI 用：hub 的執行緒把訊息交給 event loop，放進 asyncio.Queue，讀取端不佔用執行緒
+    def __init__(self, topics, loop):
+        self.topics = topics
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=PUSH_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:  # event loop 已關閉
+            self.overflowed = True
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class TopicHub:
+    # 每個 topic 每個週期只向上游抓一次，再把差異推送給所有訂閱者
+    # loader(topic) 回傳該 topic 最新的資料；intervals 為 {topic 種類: 更新週期秒數}
+    def __init__(self, loader, intervals):
+        self.loader = loader
+        self.intervals = intervals
+        self._subscribers = {}  # {topic: set(Subscription)}
+        self._last_values = {}  # {topic: 最近一次推送的資料}
+        self._next_due = {}  # {topic: 下一次更新的時間}
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def subscribe(self, topics, sub=None):
+        # 回傳 Subscription；訂閱者已達 PUSH_MAX_SUBSCRIBERS 時回傳 None
+        sub = sub or Subscription(topics)
+        with self._lock:
+            if len(self._subscriptions) >= PUSH_MAX_SUBSCRIBERS:
+                return None
+            self._subscriptions.add(sub)
+            for topic in topics:
+                self._subscribers.setdefault(topic, set()).add(sub)
+                self._next_due.setdefault(topic, 0.0)
+                if topic in self._last_values:
+                    sub.put({"type": "snapshot", "topic": topic_name(topic), "data": self._last_values[topic]})
+        self.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscriptions.discard(sub)
+            for topic in sub.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(sub)
+                if not subscribers:
+                    # 沒人訂閱的 topic 不再更新
+                    del self._subscribers[topic]
+                    self._last_values.pop(topic, None)
+                    self._next_due.pop(topic, None)
+
+    def _publish(self, topic, value):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+            if not subscribers:
+                return
+            old = self._last_values.get(topic, _MISSING)
+            self._last_values[topic] = value
+        if old is _MISSING:
+            message = {"type": "snapshot", "topic": topic_name(topic), "data": value}
+        else:
+            diff = diff_values(old, value)
+            if diff is None:
+                return
+            message = dict(diff, type="diff", topic=topic_name(topic))
+        for sub in subscribers:
+            sub.put(message)
+
+    def refresh_due(self):
+        now = time.time()
+        with self._lock:
+            due = [topic for topic, at in self._next_due.items() if at <= now]
+            for topic in due:
+                self._next_due[topic] = now + self.intervals.get(topic[0], 30.0)
+        if not due:
+            return
+
+        def load(topic):
+            try:
+                return self.loader(topic)
+            except Exception:
+                logger.exception("推播 topic 更新失敗：%r", topic)
+                return None
+
+        for topic, value in fetch_concurrently(load, due, executor=push_executor).items():
+            if value is not None:
+                self._publish(topic, value)
+
+    def _run(self):
+        while True:
+            self.refresh_due()
+            time.sleep(PUSH_TICK_SECONDS)
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="push-hub", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "topics": len(self._subscribers),
+                "subscriptions": len(self._subscriptions),
+                "max_subscriptions": PUSH_MAX_SUBSCRIBERS,
+            }
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import threading
+import time
+
+# 優先權：前端互動請求優先，背景更新 (預熱、輪詢) 只能用剩下的額度
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = ("interactive", "background")  # 監控指標用
+
+# 1inch API 的分類，每一類各有一個 bucket
+API_FAMILIES = ("balance", "token", "price", "charts", "orderbook", "nft", "gas-price")
+
+# 全域每秒請求上限 (對應 1inch 方案額度)，以及 burst 大小
+UPSTREAM_MAX_RPS = float(os.getenv("UPSTREAM_MAX_RPS", "10"))
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", str(max(1.0, UPSTREAM_MAX_RPS))))
+
+# 背景請求不能把 bucket 用到低於這個比例，保留給互動請求
+BACKGROUND_RESERVE = float(os.getenv("RATE_LIMIT_BACKGROUND_RESERVE", "0.2"))
+
+
+def family_env_rate(family):
+    # 例如 RATE_LIMIT_GAS_PRICE_RPS=2；未設定時沿用全域上限
+    value = os.getenv(f"RATE_LIMIT_{family.upper().replace('-', '_')}_RPS")
+    return float(value) if value else UPSTREAM_MAX_RPS
+
+
+class TokenBucket:
+    def __init__(self, name, rate, capacity, background_reserve=BACKGROUND_RESERVE):
+        self.name = name
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.background_floor = min(self.capacity * background_reserve, self.capacity - 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting = [0, 0]  # [互動, 背景] 正在等待的數量
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self, priority):
+        # 成功拿到 token 回傳 0，否則回傳建議等待的秒數
+        self._refill(time.monotonic())
+        if priority == PRIORITY_BACKGROUND and self._waiting[PRIORITY_INTERACTIVE]:
+            return 1.0 / self.rate
+        need = 1 + (self.background_floor if priority == PRIORITY_BACKGROUND else 0)
+        if self._tokens >= need:
+            self._tokens -= 1
+            return 0.0
+        return (need - self._tokens) / self.rate
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        # 阻塞直到拿到一個 token，回傳實際等待秒數
+        if self.rate <= 0:
+            return 0.0
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    wait = self._try_take(priority)
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+        return time.monotonic() - start
+
+    async def acquire_async(self, priority=PRIORITY_INTERACTIVE):
+        # ASGI 模式用：與 acquire 共用同一個 bucket，但以 asyncio.sleep 等待，不佔住執行緒
+        if self.rate <= 0:
+            return 0.0
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(priority)
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+        return time.monotonic() - start
+
+    def snapshot(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "tokens": round(self._tokens, 3),
+                "capacity": self.capacity,
+                "fill_ratio": round(self._tokens / self.capacity, 3),
+                "rate_per_second": self.rate,
+                "waiting_interactive": self._waiting[PRIORITY_INTERACTIVE],
+                "waiting_background": self._waiting[PRIORITY_BACKGROUND],
+            }
+
+
+class RateLimiter:
+    # 每次上游呼叫需同時取得該 family 的 token 與全域 token
+    def __init__(self, global_rate=UPSTREAM_MAX_RPS, burst=UPSTREAM_BURST):
+        self.global_bucket = TokenBucket("global", global_rate, burst)
+        self.buckets = {}
+        for family in API_FAMILIES:
+            rate = family_env_rate(family)
+            self.buckets[family] = TokenBucket(family, rate, min(burst, max(1.0, rate)))
+
+    def acquire(self, family, priority=PRIORITY_INTERACTIVE):
+        waited = 0.0
+        bucket = self.buckets.get(family)
+        if bucket is not None:
+            waited += bucket.acquire(priority)
+        waited += self.global_bucket.acquire(priority)
+        return waited
+
+    async def acquire_async(self, family, priority=PRIORITY_INTERACTIVE):
+        waited = 0.0
+        bucket = self.buckets.get(family)
+        if bucket is not None:
+            waited += await bucket.acquire_async(priority)
+        waited += await self.global_bucket.acquire_async(priority)
+        return waited
+
+    def snapshot(self):
+        result = {"global": self.global_bucket.snapshot()}
+        for family, bucket in self.buckets.items():
+            result[family] = bucket.snapshot()
+        return result
+
+
+# 整個 process 共用的 limiter
+rate_limiter = RateLimiter()
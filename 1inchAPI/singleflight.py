@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    # 相同 key 同時只會執行一次 fn，其餘呼叫者等待並共用同一份結果 (或例外)
+    # 注意：共用的結果是同一個物件，呼叫端不可就地修改
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0  # 被合併掉的呼叫次數
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    # asyncio 版的 SingleFlight，供 ASGI 模式使用 (只能在同一個 event loop 中使用)
+    # fn 以獨立的 task 執行，發起的請求被取消 (前端斷線) 時，其他等待者仍能拿到結果
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # 所有等待者都已離開時，避免 "exception was never retrieved" 警告
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+def normalize_params(params):
+    # 把 query 參數轉成可 hash、與順序無關的 key
+    if not params:
+        return ()
+    items = []
+    for name, value in params.items():
+        if isinstance(value, (list, tuple)):
+            value = tuple(str(v) for v in value)
+        else:
+            value = str(value)
+        items.append((name, value))
+    return tuple(sorted(items))
@@ -0,0 +1,145 @@
+# orderbook 的 cursor 分頁、索引序號、移除紀錄與錯誤 cursor 的測試；上游為 conftest.py 啟動的 mock_1inch
+# 執行：cd 1inchAPI && python -m pytest -q test_orderbook.py
+import pytest
+
+import Controller
+import orderbook
+from orderbook import CursorError, OrderIndex, decode_cursor, encode_cursor, next_page_cursor, parse_page_args
+
+
+def wallet_address(i):
+    return "0x%040x" % (0xbeef0000 + i)
+
+
+def order(hash_suffix, remaining="100"):
+    return {"orderHash": "0xAB" + hash_suffix, "remainingMakerAmount": remaining}
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"l": 50, "p": 3})
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"l": 50, "p": 3}
+
+
+# 依序為：不是 base64、不是 JSON object、不是 JSON ("not json")
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor([1, 2]), "bm90IGpzb24"])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(CursorError):
+        decode_cursor(cursor)
+
+
+def test_parse_page_args():
+    assert parse_page_args({}) == (orderbook.ORDERBOOK_DEFAULT_LIMIT, 1)
+    assert parse_page_args({"limit": "7"}) == (7, 1)
+    # cursor 中的 limit 優先
+    assert parse_page_args({"limit": "7", "cursor": encode_cursor({"l": 3, "p": 2})}) == (3, 2)
+    for args in ({"limit": "0"}, {"limit": "abc"}, {"limit": str(orderbook.ORDERBOOK_MAX_LIMIT + 1)},
+                 {"cursor": encode_cursor({"l": 3})}, {"cursor": encode_cursor({"l": 3, "p": 0})}):
+        with pytest.raises(CursorError):
+            parse_page_args(args)
+
+
+def test_next_page_cursor_only_for_full_pages():
+    assert decode_cursor(next_page_cursor([{}] * 5, 5, 1)) == {"l": 5, "p": 2}
+    assert next_page_cursor([{}] * 4, 5, 1) is None
+    assert next_page_cursor({"error": "x"}, 5, 1) is None
+
+
+def test_wallet_orders_paging_covers_every_order():
+    client = Controller.app.test_client()
+    url = f"/api/OrderBook/Wallet/ethereum/{wallet_address(1)}/orders"
+    hashes = []
+    response = client.get(url, query_string={"limit": 8}).get_json()
+    pages = 1
+    while True:
+        assert response["limit"] == 8
+        hashes.extend(item["orderHash"] for item in response["orders"])
+        if response["next_cursor"] is None:
+            break
+        response = client.get(url, query_string={"cursor": response["next_cursor"]}).get_json()
+        pages += 1
+    assert pages == 3
+    assert len(hashes) == len(set(hashes)) == 20  # mock 的每個錢包有 20 筆訂單
+
+
+def test_index_seq_numbering():
+    index = OrderIndex()
+    index.upsert([order("01"), order("02")], now=1.0)
+    assert index.seq == 2
+    # 內容沒變不配新的 seq
+    index.upsert([order("01")], now=2.0)
+    assert index.seq == 2
+    since = index.cursor()
+    index.upsert([order("02", remaining="50")], now=3.0)
+    full, orders, removed = index.changes_since(since)
+    assert (full, removed) == (False, [])
+    assert orders == [order("02", remaining="50")]
+
+    # 完整清單中沒有的訂單記為移除，之後再出現會重新配 seq
+    since = index.cursor()
+    index.replace([order("02", remaining="50")], now=4.0)
+    assert index.changes_since(since) == (False, [], ["0xab01"])
+    index.replace([order("01"), order("02", remaining="50")], now=5.0)
+    full, orders, removed = index.changes_since(since)
+    assert orders == [order("01")] and removed == []
+
+
+def test_cursor_from_other_epoch_returns_full_list():
+    index = OrderIndex()
+    index.replace([order("01")], now=1.0)
+    other = OrderIndex()
+    assert index.changes_since(other.cursor()) == (True, [order("01")], [])
+    assert index.changes_since(None)[0] is True
+
+
+def test_trimmed_tombstones_fall_back_to_full(monkeypatch):
+    monkeypatch.setattr(orderbook, "ORDERBOOK_TOMBSTONE_KEEP", 2)
+    index = OrderIndex()
+    index.replace([order("%02d" % i) for i in range(5)], now=1.0)
+    old_cursor = index.cursor()
+    index.replace([order("00"), order("01")], now=2.0)  # 移除 3 筆，只保留最新的 2 筆紀錄
+    assert len(index.removed) == 2
+
+    full, orders, removed = index.changes_since(old_cursor)
+    assert full is True and removed == []
+    assert [item["orderHash"] for item in orders] == ["0xAB00", "0xAB01"]
+
+    # 在最舊保留紀錄之後的 cursor 仍可增量回答
+    recent = index.cursor()
+    index.replace([order("00")], now=3.0)
+    assert index.changes_since(recent) == (False, [], ["0xab01"])
+
+
+def test_sync_route_full_then_incremental():
+    client = Controller.app.test_client()
+    url = f"/api/OrderBook/Wallet/ethereum/{wallet_address(2)}/sync"
+    first = client.get(url).get_json()
+    assert first["full"] is True and first["total"] == len(first["orders"]) == 20
+    # ORDERBOOK_SYNC_INTERVAL_SECONDS 內不重新抓取，沒有變化
+    second = client.get(url, query_string={"cursor": first["cursor"]}).get_json()
+    assert (second["full"], second["orders"], second["removed"]) == (False, [], [])
+    assert second["cursor"] == first["cursor"]
+
+
+@pytest.mark.parametrize("path, query", [
+    ("sync", {"cursor": "%%%"}),
+    ("orders", {"cursor": "%%%"}),
+    ("orders", {"limit": "abc"}),
+    ("", {"limit": "0"}),
+])
+def test_bad_cursor_or_limit_returns_400(path, query):
+    client = Controller.app.test_client()
+    url = f"/api/OrderBook/Wallet/ethereum/{wallet_address(3)}" + (f"/{path}" if path else "")
+    response = client.get(url, query_string=query)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_by_hash_hit_has_same_shape_as_miss():
+    client = Controller.app.test_client()
+    url = "/api/OrderBook/Hash/ethereum/0x" + "12" * 32
+    miss = client.get(url)
+    hit = client.get(url)
+    assert (miss.headers["X-Cache"], hit.headers["X-Cache"]) == ("MISS", "HIT")
+    assert hit.get_json() == miss.get_json()
+    assert "orderStatus" in hit.get_json()
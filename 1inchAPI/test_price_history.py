@@ -0,0 +1,143 @@
+# price_history 的區間運算與增量抓取測試；上游以假的 fetch_range 取代，不需要網路
+# 執行：cd 1inchAPI && python -m pytest -q test_price_history.py
+import time
+
+import pytest
+
+import price_history
+from price_history import PriceSeries, add_interval, clip_intervals, subtract_intervals
+
+STEP = 60
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    # 每 STEP 秒一個點，價格等於時間；回傳記錄下來的呼叫 [(start, end), ...]
+    calls = []
+
+    def fetch_range(chain_id, token_address, start, end):
+        calls.append((start, end))
+        first = start + (-start % STEP)
+        return [(t, float(t)) for t in range(first, end + 1, STEP)]
+
+    monkeypatch.setattr(price_history, "fetch_range", fetch_range)
+    monkeypatch.setattr(price_history, "HISTORY_FRESHNESS_LAG_SECONDS", 0)
+    price_history.price_series_cache.clear()
+    return calls
+
+
+def settled_base():
+    # 遠早於現在、對齊 STEP 的起點，資料都已穩定
+    return (int(time.time()) - 30 * 86400) // STEP * STEP
+
+
+def test_subtract_intervals():
+    covered = [(100, 199), (300, 399)]
+    assert subtract_intervals([], 0, 50) == [(0, 50)]
+    # 完全包含在已涵蓋區間內
+    assert subtract_intervals(covered, 120, 180) == []
+    # 與兩個區間重疊，中間與兩端都有缺口
+    assert subtract_intervals(covered, 50, 450) == [(50, 99), (200, 299), (400, 450)]
+    # 剛好接在區間尾端
+    assert subtract_intervals(covered, 200, 250) == [(200, 250)]
+    assert subtract_intervals(covered, 150, 250) == [(200, 250)]
+
+
+def test_add_interval_merges_overlapping_and_adjacent():
+    assert add_interval([(100, 199)], 200, 299) == [(100, 299)]  # 相鄰
+    assert add_interval([(100, 199)], 150, 250) == [(100, 250)]  # 重疊
+    assert add_interval([(100, 199)], 120, 130) == [(100, 199)]  # 被包含
+    assert add_interval([(100, 199)], 201, 299) == [(100, 199), (201, 299)]  # 中間有空隙
+    assert add_interval([(0, 9), (20, 29)], 10, 19) == [(0, 29)]  # 補滿兩個區間之間
+
+
+def test_clip_intervals():
+    assert clip_intervals([(0, 9), (20, 29), (40, 49)], 5, 25) == [(5, 9), (20, 25)]
+    assert clip_intervals([(0, 9)], 10, 20) == []
+
+
+def test_merge_points_appends_and_overwrites():
+    series = PriceSeries()
+    series.merge_points([(1, 1.0), (2, 2.0)])
+    series.merge_points([(3, 3.0)])
+    series.merge_points([(0, 0.5), (2, 2.5)])
+    assert list(series.times) == [0, 1, 2, 3]
+    assert list(series.values) == [0.5, 1.0, 2.5, 3.0]
+
+
+def test_trim_drops_far_end_and_shrinks_coverage(monkeypatch):
+    monkeypatch.setattr(price_history, "HISTORY_MAX_POINTS", 5)
+    series = PriceSeries()
+    series.merge_points([(t, float(t)) for t in range(10)])
+    series.covered = [(0, 9)]
+
+    # 查詢靠近尾端：丟掉最舊的點
+    series.trim(8, 9)
+    assert list(series.times) == [5, 6, 7, 8, 9]
+    assert series.covered == [(5, 9)]
+
+    # 查詢靠近開頭：丟掉最新的點
+    series.merge_points([(t, float(t)) for t in range(10, 13)])
+    series.covered = [(5, 12)]
+    series.trim(5, 6)
+    assert list(series.times) == [5, 6, 7, 8, 9]
+    assert series.covered == [(5, 9)]
+
+
+def test_overlapping_and_contained_queries_fetch_only_gaps(fake_upstream):
+    base = settled_base()
+    result, gaps = price_history.get_price_history("1", "0xToken", base, base + 10 * STEP)
+    assert gaps == 1 and len(result["data"]) == 11
+
+    # 被包含的範圍不打上游
+    result, gaps = price_history.get_price_history("1", "0xtoken", base + 2 * STEP, base + 5 * STEP)
+    assert gaps == 0
+    assert [point["t"] for point in result["data"]] == [base + i * STEP for i in range(2, 6)]
+
+    # 往後滑動：只抓新的一段
+    result, gaps = price_history.get_price_history("1", "0xToken", base + 5 * STEP, base + 15 * STEP)
+    assert gaps == 1 and fake_upstream[-1] == (base + 10 * STEP + 1, base + 15 * STEP)
+    assert len(result["data"]) == 11
+
+    # 跨兩端：前後各補一段
+    fake_upstream.clear()
+    result, gaps = price_history.get_price_history("1", "0xToken", base - 5 * STEP, base + 20 * STEP)
+    assert sorted(fake_upstream) == [(base - 5 * STEP, base - 1), (base + 15 * STEP + 1, base + 20 * STEP)]
+    assert len(result["data"]) == 26
+
+    # 相鄰的範圍已合併成一個區間
+    series = price_history.price_series_cache.get(("1", "0xtoken"))
+    assert series.covered == [(base - 5 * STEP, base + 20 * STEP)]
+
+
+def test_unsettled_tail_is_refetched(fake_upstream, monkeypatch):
+    monkeypatch.setattr(price_history, "HISTORY_FRESHNESS_LAG_SECONDS", 300)
+    now = int(time.time())
+    start = now - 3600
+
+    price_history.get_price_history("1", "0xRecent", start, now)
+    series = price_history.price_series_cache.get(("1", "0xrecent"))
+    # 最近 HISTORY_FRESHNESS_LAG_SECONDS 內的資料不算涵蓋
+    assert len(series.covered) == 1
+    assert series.covered[0][0] == start and series.covered[0][1] <= now - 300
+
+    fake_upstream.clear()
+    _, gaps = price_history.get_price_history("1", "0xRecent", start, now)
+    assert gaps == 1 and fake_upstream[0][0] > now - 300 - STEP
+
+
+def test_query_beyond_max_points_returns_full_range(fake_upstream, monkeypatch):
+    monkeypatch.setattr(price_history, "HISTORY_MAX_POINTS", 10)
+    base = settled_base()
+    price_history.get_price_history("1", "0xCap", base, base + 9 * STEP)
+
+    # 超過上限時這次查詢的結果仍完整，之後丟掉較舊的一端，需要時重新抓
+    result, _ = price_history.get_price_history("1", "0xCap", base + 10 * STEP, base + 19 * STEP)
+    assert len(result["data"]) == 10
+    series = price_history.price_series_cache.get(("1", "0xcap"))
+    assert len(series.times) == 10 and series.times[0] == base + 10 * STEP
+    assert series.covered[0][0] == base + 10 * STEP
+
+    fake_upstream.clear()
+    result, gaps = price_history.get_price_history("1", "0xCap", base, base + 2 * STEP)
+    assert gaps == 1 and len(result["data"]) == 3
@@ -0,0 +1,44 @@
+# 推播 hub 的測試：上游為 conftest.py 啟動的 mock_1inch
+# 執行：cd 1inchAPI && python -m pytest -q test_pubsub.py
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import time
+
+import Controller
+from concurrency import UPSTREAM_MAX_WORKERS
+
+TIMEOUT_SECONDS = 30
+
+
+def wallet_address(i):
+    return "0x%040x" % (0xfeed0000 + i)
+
+
+def test_more_wallet_topics_than_upstream_workers():
+    # 同時到期的錢包 topic 比 upstream_executor 的執行緒還多時，hub 不能卡死
+    topics = [("wallet", "1", wallet_address(i)) for i in range(UPSTREAM_MAX_WORKERS + 4)]
+    sub = Controller.push_hub.subscribe(topics)
+    try:
+        snapshots = set()
+        deadline = time.time() + TIMEOUT_SECONDS
+        while len(snapshots) < len(topics) and time.time() < deadline:
+            try:
+                message = sub.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            if message["type"] == "snapshot":
+                snapshots.add(message["topic"])
+        assert len(snapshots) == len(topics)
+    finally:
+        Controller.push_hub.unsubscribe(sub)
+
+    # 之後一般的請求仍然可以完成
+    def request_balance():
+        client = Controller.app.test_client()
+        return client.get("/api/Token/CombinedBalance/ethereum/" + wallet_address(1000)).status_code
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        assert executor.submit(request_balance).result(timeout=TIMEOUT_SECONDS) == 200
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+
+from concurrency import fetch_concurrently
+from metrics import register_collector
+from rate_limiter import PRIORITY_BACKGROUND
+import upstream
+from upstream import UpstreamError
+
+logger = logging.getLogger(__name__)
+
+TOKEN_LIST_ENABLED = os.getenv("TOKEN_LIST_ENABLED", "1") == "1"
+# 每條鏈的完整 token 清單多久重新下載一次 (秒)
+TOKEN_LIST_REFRESH_SECONDS = float(os.getenv("TOKEN_LIST_REFRESH_SECONDS", str(6 * 3600)))
+# 下載失敗的鏈多久後重試
+TOKEN_LIST_RETRY_SECONDS = float(os.getenv("TOKEN_LIST_RETRY_SECONDS", "300"))
+
+
+def address_key(token_address):
+    # "0xAbC..." -> 20 bytes，比字串 key 省記憶體且不分大小寫；格式不符時回傳 None
+    try:
+        return bytes.fromhex(token_address[2:] if token_address[:2].lower() == "0x" else token_address)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_token_list(list_res):
+    # /token/v1.2/{chain} 回傳 {address: token}；部分版本包在 {"tokens": {...}} 中
+    if isinstance(list_res, dict) and isinstance(list_res.get("tokens"), dict):
+        list_res = list_res["tokens"]
+    index = {}
+    if not isinstance(list_res, dict):
+        return index
+    for token_addr, token in list_res.items():
+        key = address_key(token_addr)
+        if key is None or not isinstance(token, dict):
+            continue
+        # 只保留 CombinedBalance 用得到的欄位，存成 tuple
+        index[key] = (token.get("symbol"), token.get("name"), token.get("decimals"), token.get("logoURI"))
+    return index
+
+
+class TokenListIndex:
+    # 每條鏈一份 {20 bytes address: (symbol, name, decimals, logoURI)}，背景定期整份重新下載後替換
+    def __init__(self):
+        self.chain_ids = []
+        self._indexes = {}  # {chain_id: index dict}
+        self._loaded_at = {}  # {chain_id: 下載完成時間}
+        self._next_due = {}  # {chain_id: 下一次下載時間}
+        self.hits = 0
+        self.misses = 0
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def lookup(self, chain_id, token_address):
+        # 回傳 CombinedBalance 用的精簡 dict (不是完整的 /custom/ 回應)，不在清單中時回傳 None
+        index = self._indexes.get(str(chain_id))
+        if index is None:
+            return None
+        entry = index.get(address_key(token_address))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        symbol, name, decimals, logo_uri = entry
+        return {"address": token_address.lower(), "symbol": symbol, "name": name,
+                "decimals": decimals, "logoURI": logo_uri}
+
+    def load(self, chain_id):
+        list_res = upstream.get_json("token", f"/token/v1.2/{chain_id}", priority=PRIORITY_BACKGROUND)
+        index = parse_token_list(list_res)
+        self._indexes[chain_id] = index  # 直接替換整份，讀取端不需要加鎖
+        self._loaded_at[chain_id] = time.time()
+        return len(index)
+
+    def refresh_due(self):
+        now = time.time()
+        due = [chain_id for chain_id in self.chain_ids if self._next_due.get(chain_id, 0.0) <= now]
+        if not due:
+            return
+
+        def load(chain_id):
+            try:
+                count = self.load(chain_id)
+                self._next_due[chain_id] = time.time() + TOKEN_LIST_REFRESH_SECONDS
+                logger.info("token 清單已更新 (chain %s)：%d 個 token", chain_id, count)
+            except UpstreamError as error:
+                self._next_due[chain_id] = time.time() + TOKEN_LIST_RETRY_SECONDS
+                logger.warning("token 清單下載失敗 (chain %s)：%s", chain_id, error.message)
+
+        fetch_concurrently(load, due)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh_due()
+            except Exception:
+                logger.exception("token 清單更新發生未預期錯誤")
+            time.sleep(min(TOKEN_LIST_RETRY_SECONDS, TOKEN_LIST_REFRESH_SECONDS))
+
+    def start(self, chain_ids):
+        # 只會啟動一次；第一次下載完成前，metadata 查詢照舊逐一打上游
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            self.chain_ids = list(chain_ids)
+        threading.Thread(target=self._run, name="token-list", daemon=True).start()
+
+    def stats(self):
+        return {
+            "chains": {chain_id: {"tokens": len(index), "loaded_at": self._loaded_at.get(chain_id)}
+                       for chain_id, index in list(self._indexes.items())},
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_list_index = TokenListIndex()
+
+
+@register_collector
+def collect_token_list():
+    stats = token_list_index.stats()
+    return [
+        ("oneinch_token_list_tokens", "gauge", "Tokens in the preloaded token list",
+         [((("chain", chain_id),), chain["tokens"]) for chain_id, chain in stats["chains"].items()]),
+        ("oneinch_token_list_lookups_total", "counter", "Token list lookups by result",
+         [((("result", "hit"),), stats["hits"]), ((("result", "miss"),), stats["misses"])]),
+    ]
@@ -0,0 +1,175 @@
+import asyncio
+from concurrent.futures import as_completed
+import os
+
+from cache import TTLCache
+from concurrency import fetch_concurrently, submit_with_context, upstream_executor
+from disk_cache import disk_cache
+from rate_limiter import PRIORITY_INTERACTIVE
+from token_list import token_list_index
+from tracing import span
+import upstream
+from upstream import UpstreamError
+
+# Token 的 name / decimals / logoURI 幾乎不會變，因此給很長的 TTL
+TOKEN_METADATA_TTL_SECONDS = int(os.getenv("TOKEN_METADATA_TTL_SECONDS", str(7 * 24 * 3600)))
+TOKEN_METADATA_MAX_ENTRIES = int(os.getenv("TOKEN_METADATA_MAX_ENTRIES", "50000"))
+# 查不到 metadata 的 token (多半是垃圾空投) 也記住一段時間，避免重複打上游
+TOKEN_METADATA_MISS_TTL_SECONDS = int(os.getenv("TOKEN_METADATA_MISS_TTL_SECONDS", "3600"))
+
+# 格式: { (chain_id, token_address 小寫): token info dict }
+token_metadata_cache = TTLCache("token_metadata", TOKEN_METADATA_MAX_ENTRIES, TOKEN_METADATA_TTL_SECONDS,
+                                backing=disk_cache)
+
+
+def metadata_key(chain_id, token_address):
+    return str(chain_id), token_address.lower()
+
+
+def known_token_metadata(chain_id, token_address):
+    # 先查預先載入的整份 token 清單，再查逐一學到的 metadata 快取；都沒有時回傳 None
+    # token 清單只有 name / symbol / decimals / logoURI，只給 CombinedBalance 用
+    info = token_list_index.lookup(chain_id, token_address)
+    if info is not None:
+        return info
+    return token_metadata_cache.get(metadata_key(chain_id, token_address))
+
+
+async def known_token_metadata_many_async(chain_id, token_addresses):
+    # known_token_metadata 的 ASGI 版本，回傳 {token_address: info} (不含沒有的 token)
+    # 記憶體都沒有的 token 一起在執行緒中查磁碟層，不阻塞 event loop
+    result = {}
+    pending = []
+    for token_addr in token_addresses:
+        info = token_list_index.lookup(chain_id, token_addr)
+        if info is None:
+            pending.append(token_addr)
+        else:
+            result[token_addr] = info
+    if pending:
+        cached = await token_metadata_cache.get_many_async([metadata_key(chain_id, token_addr) for token_addr in pending])
+        for token_addr in pending:
+            info = cached.get(metadata_key(chain_id, token_addr))
+            if info is not None:
+                result[token_addr] = info
+    return result
+
+
+def fetch_token_metadata(chain_id, token_address, priority=PRIORITY_INTERACTIVE):
+    # 回傳完整的 token info dict (TokenInfo 用，不查精簡的 token 清單)；上游回 4xx (不是合法 token) 時回傳空 dict
+    info = token_metadata_cache.get(metadata_key(chain_id, token_address))
+    if info is not None:
+        return info
+    return load_token_metadata(chain_id, token_address, priority)
+
+
+def load_token_metadata(chain_id, token_address, priority=PRIORITY_INTERACTIVE):
+    # 向上游取得並寫入快取；排隊期間若已被其他錢包的請求載入，就直接沿用
+    key = metadata_key(chain_id, token_address)
+    info = token_metadata_cache.peek(key)
+    if info is not None:
+        return info
+    try:
+        info = upstream.get_json("token", token_metadata_path(chain_id, token_address), priority=priority)
+    except UpstreamError as error:
+        return store_token_metadata_error(key, error)
+
+    token_metadata_cache.set(key, info)
+    return info
+
+
+def token_metadata_path(chain_id, token_address):
+    return f"/token/v1.2/{chain_id}/custom/{token_address}"
+
+
+def store_token_metadata_error(key, error, in_background=False):
+    # 上游 4xx (不是合法 token) 時記住空結果並回傳 {}，其他錯誤原樣拋出
+    if error.http_status == 502:
+        raise error
+    store = token_metadata_cache.set_in_background if in_background else token_metadata_cache.set
+    store(key, {}, ttl_seconds=TOKEN_METADATA_MISS_TTL_SECONDS)
+    return {}
+
+
+async def fetch_token_metadata_async(chain_id, token_address, priority=PRIORITY_INTERACTIVE):
+    # fetch_token_metadata 的 ASGI 版本
+    entry = await token_metadata_cache.get_entry_async(metadata_key(chain_id, token_address))
+    if entry is not None:
+        return entry[0]
+    return await load_token_metadata_async(chain_id, token_address, priority)
+
+
+async def load_token_metadata_async(chain_id, token_address, priority=PRIORITY_INTERACTIVE):
+    key = metadata_key(chain_id, token_address)
+    info = token_metadata_cache.peek(key)
+    if info is not None:
+        return info
+    try:
+        info = await upstream.get_json_async("token", token_metadata_path(chain_id, token_address), priority=priority)
+    except UpstreamError as error:
+        return store_token_metadata_error(key, error, in_background=True)
+
+    token_metadata_cache.set_in_background(key, info)
+    return info
+
+
+def split_cached_metadata(chain_id, token_addresses):
+    # 回傳 ({token_address: 快取中的 info}, [快取中沒有的 token_address])
+    result = {}
+    missing = []
+    with span("cache.token_metadata", tokens=len(token_addresses)) as current:
+        for token_addr in token_addresses:
+            info = known_token_metadata(chain_id, token_addr)
+            if info is None:
+                missing.append(token_addr)
+            else:
+                result[token_addr] = info
+        if current is not None:
+            current.attrs["missing"] = len(missing)
+    return result, missing
+
+
+def get_token_metadata_many(chain_id, token_addresses, priority=PRIORITY_INTERACTIVE):
+    # 先查快取，只有沒看過的 token 才並行打上游，回傳 {token_address: info}
+    result, missing = split_cached_metadata(chain_id, token_addresses)
+
+    if missing:
+        result.update(fetch_concurrently(
+            lambda token_addr: load_token_metadata(chain_id, token_addr, priority), missing))
+    return result
+
+
+def iter_token_metadata(chain_id, token_addresses, priority=PRIORITY_INTERACTIVE):
+    # 逐筆產生 (token_address, info)：快取中已有的先給，其餘依上游回應完成的先後順序給
+    missing = []
+    for token_addr in token_addresses:
+        info = known_token_metadata(chain_id, token_addr)
+        if info is None:
+            missing.append(token_addr)
+        else:
+            yield token_addr, info
+
+    futures = {submit_with_context(upstream_executor, load_token_metadata, chain_id, token_addr, priority): token_addr
+               for token_addr in missing}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # 呼叫端中途停止 (例如前端斷線) 時，取消尚未開始的查詢
+        for future in futures:
+            future.cancel()
+
+
+async def get_token_metadata_many_async(chain_id, token_addresses, priority=PRIORITY_INTERACTIVE):
+    # get_token_metadata_many 的 ASGI 版本：沒看過的 token 以 coroutine 並行抓取，速率仍由 rate_limiter 控制
+    with span("cache.token_metadata", tokens=len(token_addresses)) as current:
+        result = await known_token_metadata_many_async(chain_id, token_addresses)
+        missing = [token_addr for token_addr in token_addresses if token_addr not in result]
+        if current is not None:
+            current.attrs["missing"] = len(missing)
+
+    if missing:
+        infos = await asyncio.gather(*(load_token_metadata_async(chain_id, token_addr, priority)
+                                       for token_addr in missing))
+        result.update(zip(missing, infos))
+    return result
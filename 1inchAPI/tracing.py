@@ -0,0 +1,199 @@
+# 單一請求的耗時追蹤 (span tree) 與 cProfile 取樣，預設關閉
+# 開啟方式：請求帶 X-Debug-Trace 標頭，或設定 TRACE_SAMPLE_RATE 隨機取樣；
+# 結果以 Server-Timing 標頭回傳，完整的 span tree 可由 /api/Status/Trace/<trace_id> 取得
+from collections import OrderedDict
+import contextlib
+import contextvars
+import cProfile
+import os
+import random
+import threading
+import time
+import uuid
+
+TRACE_HEADER = "X-Debug-Trace"
+PROFILE_HEADER = "X-Debug-Profile"
+# 有設定時，X-Debug-Trace 的值必須等於此 token 才會生效 (正式環境建議設定)
+# X-Debug-Profile 會寫檔，只有設定了 TRACE_TOKEN 且值相符時才生效
+TRACE_TOKEN = os.getenv("TRACE_TOKEN")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "200"))  # 保留最近幾筆 trace 供查詢
+
+PROFILE_ROUTES = {name.strip() for name in os.getenv("PROFILE_ROUTES", "get_CombinedBalance,get_NFTs").split(",")
+                  if name.strip()}
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))  # PROFILE_DIR 中最多保留幾個 .prof 檔，舊的會被刪除
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "children", "trace")
+
+    def __init__(self, name, trace, attrs=None):
+        self.name = name
+        self.trace = trace
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.duration = None
+        self.children = []
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self, origin):
+        result = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            result["attrs"] = self.attrs
+        if self.children:
+            result["children"] = [child.to_dict(origin) for child in list(self.children)]
+        return result
+
+
+class Trace:
+    def __init__(self, name, reason):
+        self.id = uuid.uuid4().hex[:16]
+        self.reason = reason  # header / sample
+        self.created_at = time.time()
+        self.lock = threading.Lock()  # 子 span 可能由多個執行緒同時加入
+        self.root = Span(name, self)
+
+    def to_dict(self):
+        return {"trace_id": self.id, "reason": self.reason, "created_at": self.created_at,
+                "root": self.root.to_dict(self.root.start)}
+
+
+# 最近的 trace { trace_id: Trace }
+_recent_traces = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    # 在目前的 span 底下記錄一段耗時；沒有啟用追蹤時不做任何事
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace, attrs)
+    with parent.trace.lock:
+        parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def annotate(**attrs):
+    # 在目前的 span 上附加資訊 (例如上游回應的 status)
+    current = _current_span.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def header_enabled(value):
+    return bool(value) and (TRACE_TOKEN is None or value == TRACE_TOKEN)
+
+
+def should_trace(headers):
+    if header_enabled(headers.get(TRACE_HEADER)):
+        return "header"
+    if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+        return "sample"
+    return None
+
+
+def start_trace(name, reason):
+    # 回傳 (trace, contextvar token)；請求結束時以 detach_trace(token) 還原
+    trace = Trace(name, reason)
+    return trace, _current_span.set(trace.root)
+
+
+def finish_trace(trace):
+    trace.root.finish()
+    with _recent_lock:
+        _recent_traces[trace.id] = trace
+        while len(_recent_traces) > TRACE_KEEP:
+            _recent_traces.popitem(last=False)
+
+
+def detach_trace(token):
+    _current_span.reset(token)
+
+
+def get_trace(trace_id):
+    with _recent_lock:
+        return _recent_traces.get(trace_id)
+
+
+def server_timing(trace):
+    # 依 span 名稱加總：name;dur=總毫秒;desc="次數"；並行的 span 會重疊，加總可能大於 total
+    totals = OrderedDict()
+    pending = list(trace.root.children)
+    while pending:
+        current = pending.pop(0)
+        if current.duration is not None:
+            total = totals.setdefault(current.name, [0.0, 0])
+            total[0] += current.duration
+            total[1] += 1
+        pending.extend(current.children)
+    parts = [f'{name};dur={duration * 1000:.1f};desc="{count}x"' for name, (duration, count) in totals.items()]
+    parts.append(f"total;dur={trace.root.duration * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# ---- cProfile 取樣 ----
+# 同一時間只能有一個 profiler 啟用，其餘請求直接略過
+_profile_lock = threading.Lock()
+
+
+def should_profile(endpoint, headers):
+    if endpoint not in PROFILE_ROUTES:
+        return False
+    if TRACE_TOKEN is not None and headers.get(PROFILE_HEADER) == TRACE_TOKEN:
+        return True
+    return bool(PROFILE_SAMPLE_RATE) and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start_profile():
+    # 回傳 profiler，已有其他請求在 profile 時回傳 None
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def prune_profiles():
+    # 只保留最新的 PROFILE_KEEP 個 .prof 檔
+    paths = [entry.path for entry in os.scandir(PROFILE_DIR) if entry.is_file() and entry.name.endswith(".prof")]
+    if len(paths) <= PROFILE_KEEP:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - PROFILE_KEEP]:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+def finish_profile(profiler, endpoint):
+    # 停止並寫出 .prof 檔 (可用 python -m pstats 或 snakeviz 開啟)，回傳檔名 (不含目錄，避免洩漏伺服器路徑)
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{endpoint}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        prune_profiles()
+        return name
+    finally:
+        _profile_lock.release()
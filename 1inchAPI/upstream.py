@@ -0,0 +1,283 @@
+import asyncio
+from dotenv import load_dotenv
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from concurrency import UPSTREAM_MAX_WORKERS
+import fastjson
+from metrics import (RATE_LIMIT_WAIT, UPSTREAM_BACKOFF, UPSTREAM_DURATION, UPSTREAM_IN_FLIGHT, UPSTREAM_RESPONSES,
+                     register_collector)
+from rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_NAMES, rate_limiter
+from singleflight import AsyncSingleFlight, SingleFlight, normalize_params
+from tracing import annotate, span
+
+# httpx 為選用套件：ASGI 模式 (asgi.py) 必須安裝；再加上 h2 時同步 client 也會改用 HTTP/2 multiplexing
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import h2  # noqa: F401
+except ImportError:
+    h2 = None
+
+load_dotenv()
+my_1inch_api_key = os.getenv("1INCH_API_KEY")
+
+API_BASE_URL = os.getenv("ONEINCH_API_BASE_URL", "https://api.1inch.dev").rstrip("/")
+
+# 每個 worker process 的 keep-alive 連線數，預設比執行緒池多留一點給 route 本身
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", str(UPSTREAM_MAX_WORKERS + 8)))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1"
+# ASGI 模式下沒有執行緒池限制並行數，連線池可以開大一點
+ASYNC_UPSTREAM_POOL_SIZE = int(os.getenv("ASYNC_UPSTREAM_POOL_SIZE", "100"))
+
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))  # 秒
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))  # 秒
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 各 API family 的 (connect, read) timeout (秒)
+UPSTREAM_TIMEOUTS = {
+    "balance": (3.05, 15),
+    "token": (3.05, 10),
+    "price": (3.05, 10),
+    "charts": (3.05, 20),
+    "orderbook": (3.05, 10),
+    "nft": (3.05, 30),
+    "gas-price": (3.05, 5),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+
+
+class UpstreamError(Exception):
+    # 上游在重試後仍失敗 (連線錯誤或非 2xx) 時拋出
+    def __init__(self, message, status_code=None, payload=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.payload = payload
+
+    @property
+    def http_status(self):
+        # 上游的 4xx 原樣回給前端，其餘一律視為 502 Bad Gateway
+        if self.status_code is not None and 400 <= self.status_code < 500 and self.status_code != 429:
+            return self.status_code
+        return 502
+
+    def to_dict(self):
+        result = {"error": self.message}
+        if self.status_code is not None:
+            result["upstream_status"] = self.status_code
+        if self.payload is not None:
+            result["upstream_response"] = self.payload
+        return result
+
+
+def backoff_delay(attempt, retry_after=None):
+    # full jitter: 在 [0, base * 2^attempt] 之間隨機，避免大家同時重試
+    if retry_after is not None:
+        return min(retry_after, UPSTREAM_BACKOFF_MAX)
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def decode_json(res):
+    # requests / httpx 的回應 body 直接交給 fastjson 解析 (有 orjson 時較快)；非 JSON 時回傳 None
+    with span("json.decode"):
+        try:
+            return fastjson.loads(res.content)
+        except ValueError:
+            return None
+
+
+def backoff_sleep(family, seconds):
+    UPSTREAM_BACKOFF.add(seconds, family)
+    with span("upstream.backoff"):
+        time.sleep(seconds)
+
+
+def parse_retry_after(value):
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamClient:
+    def __init__(self, base_url=API_BASE_URL, api_key=my_1inch_api_key, pool_size=UPSTREAM_POOL_SIZE):
+        self.base_url = base_url
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        if httpx is not None and h2 is not None and UPSTREAM_HTTP2:
+            self.transport = "httpx"
+            self._client = httpx.Client(
+                http2=True,
+                headers=headers,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        else:
+            self.transport = "requests"
+            self._client = requests.Session()
+            self._client.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+            self._client.mount("https://", adapter)
+            self._client.mount("http://", adapter)
+
+    def _send(self, url, params, timeout):
+        if self.transport == "httpx":
+            connect, read = timeout
+            return self._client.get(url, params=params, timeout=httpx.Timeout(read, connect=connect))
+        return self._client.get(url, params=params, timeout=timeout)
+
+    def get_json(self, family, path, params=None, priority=PRIORITY_INTERACTIVE):
+        url = f"{self.base_url}{path}"
+        timeout = UPSTREAM_TIMEOUTS.get(family, DEFAULT_TIMEOUT)
+        transport_errors = (requests.RequestException,) if httpx is None else (requests.RequestException, httpx.HTTPError)
+
+        for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+            last_try = attempt == UPSTREAM_MAX_RETRIES
+            # 每一次送出 (包含重試) 都要先向 limiter 取得額度
+            with span("ratelimit.wait"):
+                waited = rate_limiter.acquire(family, priority)
+            RATE_LIMIT_WAIT.observe(waited, family, PRIORITY_NAMES[priority])
+            started = time.perf_counter()
+            UPSTREAM_IN_FLIGHT.inc(family)
+            try:
+                with span("upstream.http", attempt=attempt):
+                    res = self._send(url, params, timeout)
+                    annotate(status=res.status_code)
+            except transport_errors as exc:
+                UPSTREAM_RESPONSES.inc(family, "error")
+                if last_try:
+                    raise UpstreamError(f"無法連線到 1inch API ({family})：{exc}")
+                backoff_sleep(family, backoff_delay(attempt))
+                continue
+            finally:
+                UPSTREAM_IN_FLIGHT.dec(family)
+                UPSTREAM_DURATION.observe(time.perf_counter() - started, family)
+
+            status = res.status_code
+            UPSTREAM_RESPONSES.inc(family, str(status))
+            if status in RETRY_STATUS_CODES and not last_try:
+                backoff_sleep(family, backoff_delay(attempt, parse_retry_after(res.headers.get("Retry-After"))))
+                continue
+            data = decode_json(res)
+            if status >= 400:
+                raise UpstreamError(f"1inch API ({family}) 回傳錯誤", status_code=status, payload=data)
+            if data is None:
+                raise UpstreamError(f"1inch API ({family}) 回傳非 JSON 內容", status_code=status)
+            return data
+
+
+class AsyncUpstreamClient:
+    # ASGI 模式用的非阻塞 client：重試、timeout 與 rate_limiter 規則都與 UpstreamClient 相同
+    def __init__(self, base_url=API_BASE_URL, api_key=my_1inch_api_key, pool_size=ASYNC_UPSTREAM_POOL_SIZE):
+        if httpx is None:
+            raise RuntimeError("ASGI 模式需要 httpx，請先執行 pip install httpx")
+        self.base_url = base_url
+        self._client = httpx.AsyncClient(
+            http2=h2 is not None and UPSTREAM_HTTP2,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def get_json(self, family, path, params=None, priority=PRIORITY_INTERACTIVE):
+        url = f"{self.base_url}{path}"
+        connect, read = UPSTREAM_TIMEOUTS.get(family, DEFAULT_TIMEOUT)
+        timeout = httpx.Timeout(read, connect=connect)
+
+        for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+            last_try = attempt == UPSTREAM_MAX_RETRIES
+            with span("ratelimit.wait"):
+                waited = await rate_limiter.acquire_async(family, priority)
+            RATE_LIMIT_WAIT.observe(waited, family, PRIORITY_NAMES[priority])
+            started = time.perf_counter()
+            UPSTREAM_IN_FLIGHT.inc(family)
+            try:
+                with span("upstream.http", attempt=attempt):
+                    res = await self._client.get(url, params=params, timeout=timeout)
+                    annotate(status=res.status_code)
+            except httpx.HTTPError as exc:
+                UPSTREAM_RESPONSES.inc(family, "error")
+                if last_try:
+                    raise UpstreamError(f"無法連線到 1inch API ({family})：{exc}")
+                await backoff_sleep_async(family, backoff_delay(attempt))
+                continue
+            finally:
+                UPSTREAM_IN_FLIGHT.dec(family)
+                UPSTREAM_DURATION.observe(time.perf_counter() - started, family)
+
+            status = res.status_code
+            UPSTREAM_RESPONSES.inc(family, str(status))
+            if status in RETRY_STATUS_CODES and not last_try:
+                await backoff_sleep_async(family, backoff_delay(attempt, parse_retry_after(res.headers.get("Retry-After"))))
+                continue
+            data = decode_json(res)
+            if status >= 400:
+                raise UpstreamError(f"1inch API ({family}) 回傳錯誤", status_code=status, payload=data)
+            if data is None:
+                raise UpstreamError(f"1inch API ({family}) 回傳非 JSON 內容", status_code=status)
+            return data
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+async def backoff_sleep_async(family, seconds):
+    UPSTREAM_BACKOFF.add(seconds, family)
+    with span("upstream.backoff"):
+        await asyncio.sleep(seconds)
+
+
+# 整個 process 共用同一個 client (連線池)
+client = UpstreamClient()
+# ASGI 模式第一次使用時才建立 (httpx 的連線池需在 event loop 中使用)
+async_client = None
+
+# 相同的上游請求 (path + 參數) 同時只會送出一次，所有 route 共用
+upstream_flight = SingleFlight()
+
+
+def get_json(family, path, params=None, priority=PRIORITY_INTERACTIVE):
+    # 被合併的呼叫者也會記錄 span (等待其他請求的結果所花的時間)
+    with span("upstream." + family, path=path):
+        return upstream_flight.do(
+            (path, normalize_params(params)),
+            lambda: client.get_json(family, path, params=params, priority=priority))
+
+
+# ASGI 模式的相同請求合併 (event loop 內)
+async_upstream_flight = AsyncSingleFlight()
+
+
+def get_async_client():
+    global async_client
+    if async_client is None:
+        async_client = AsyncUpstreamClient()
+    return async_client
+
+
+@register_collector
+def collect_single_flight():
+    # 被合併掉 (沒有真的送出) 的上游請求數
+    return [("oneinch_upstream_coalesced_total", "counter", "Upstream calls served by an identical in-flight call",
+             [((("mode", "sync"),), upstream_flight.coalesced), ((("mode", "async"),), async_upstream_flight.coalesced)])]
+
+
+async def get_json_async(family, path, params=None, priority=PRIORITY_INTERACTIVE):
+    # get_json 的非阻塞版本，供 asgi.py 使用
+    with span("upstream." + family, path=path):
+        return await async_upstream_flight.do(
+            (path, normalize_params(params)),
+            lambda: get_async_client().get_json(family, path, params=params, priority=priority))
+
+
+async def close_async_client():
+    global async_client
+    if async_client is not None:
+        await async_client.aclose()
+        async_client = None
@@ -0,0 +1,135 @@
+# CombinedBalance 的估值：整個錢包的餘額與價格一次算完，並在查 metadata 之前濾掉灰塵 / 垃圾 token
+# 餘額是 uint256 字串，18 位小數的 token 用 float 會失真，因此全程以 int / Decimal 計算
+from decimal import Decimal, InvalidOperation, localcontext
+import os
+
+from metrics import Counter
+from token_metadata import known_token_metadata
+from tracing import span
+
+# 美元價值低於此值的 token 不回傳也不查 metadata；設為 0 時只排除餘額為 0 的 token
+DUST_USD_THRESHOLD = Decimal(os.getenv("DUST_USD_THRESHOLD", "0.01"))
+# uint256 最多 78 位數，加上價格的有效位數仍在此精度內，不會捨入
+VALUATION_PRECISION = 120
+
+VALUATION_TOKENS = Counter("oneinch_valuation_tokens_total",
+                           "Wallet tokens by valuation result (kept, zero, dust)", ("result",))
+
+
+def parse_decimal(value):
+    # 價格字串 -> Decimal；格式錯誤、負數、NaN / Infinity 一律視為 0
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+    if not number.is_finite() or number < 0:
+        return Decimal(0)
+    return number
+
+
+def parse_decimals(value):
+    try:
+        decimals = int(value)
+    except (TypeError, ValueError):
+        return None
+    return decimals if 0 <= decimals <= 255 else None
+
+
+def format_amount(amount):
+    # 不用科學記號，去掉多餘的 0："1500000000000000000" (18 位) -> "1.5"
+    if amount == 0:
+        return "0"
+    return format(amount.normalize(), "f")
+
+
+class TokenValuation:
+    __slots__ = ("address", "raw", "price", "decimals", "amount", "usd")
+
+    def __init__(self, address, raw, price, decimals=None):
+        self.address = address
+        self.raw = raw  # 最小單位的整數餘額
+        self.price = price  # 每顆 token 的美元價格 (Decimal)
+        self.decimals = None
+        self.amount = None
+        self.usd = None
+        if decimals is not None:
+            self.resolve(decimals)
+
+    def resolve(self, decimals):
+        # 價格 API 與已知 metadata 都沒有 decimals 時，等 metadata 查回來再計算
+        if self.decimals is None:
+            with localcontext() as context:
+                context.prec = VALUATION_PRECISION
+                self.decimals = decimals
+                self.amount = Decimal(self.raw).scaleb(-decimals)
+                self.usd = self.amount * self.price
+        return self
+
+    def is_dust(self):
+        return self.usd is not None and DUST_USD_THRESHOLD > 0 and self.usd < DUST_USD_THRESHOLD
+
+
+def known_decimals(chain_id, token_address, token_price_info, known_metadata=None):
+    # decimals 優先取價格回應中的值，其次是 token 清單 / metadata 快取，都沒有時回傳 None
+    # known_metadata 為事先查好的 {token_address: info}，有給時不再查快取
+    decimals = parse_decimals(token_price_info.get("decimals"))
+    if decimals is None:
+        if known_metadata is None:
+            info = known_token_metadata(chain_id, token_address)
+        else:
+            info = known_metadata.get(token_address)
+        if info:
+            decimals = parse_decimals(info.get("decimals"))
+    return decimals
+
+
+def needs_known_decimals(token_addresses, token_price_map):
+    # 有報價、但價格回應中沒有 decimals 的 token，估值時要查 token 清單 / metadata 快取
+    result = []
+    for token_addr in token_addresses:
+        token_price_info = token_price_map.get(token_addr.lower())
+        if isinstance(token_price_info, dict) and parse_decimals(token_price_info.get("decimals")) is None:
+            result.append(token_addr)
+    return result
+
+
+def valuate_balances(chain_id, balance_res, token_price_map, known_metadata=None):
+    # 一次走過整個錢包，回傳 {token_address: TokenValuation}，依美元價值由高到低排序
+    # 餘額為 0、估值低於 DUST_USD_THRESHOLD、以及沒有報價的 token 都會被排除，之後不會為它們查 metadata
+    kept = []
+    zero = dust = 0
+    with span("compute.valuation", tokens=len(balance_res)) as current:
+        for token_addr, raw_balance_str in balance_res.items():
+            try:
+                raw = int(raw_balance_str)
+            except (TypeError, ValueError):
+                raw = 0
+            if raw <= 0:
+                zero += 1
+                continue
+
+            token_price_info = token_price_map.get(token_addr.lower()) or {}
+            if not isinstance(token_price_info, dict):
+                token_price_info = {}
+            price = parse_decimal(token_price_info.get("price", "0"))
+            if price == 0 and DUST_USD_THRESHOLD > 0:
+                # 沒有報價的多半是垃圾空投，不論 decimals 為何價值都是 0
+                dust += 1
+                continue
+
+            decimals = known_decimals(chain_id, token_addr, token_price_info, known_metadata)
+            valuation = TokenValuation(token_addr, raw, price, decimals)
+            if valuation.is_dust():
+                dust += 1
+                continue
+            kept.append(valuation)
+
+        if current is not None:
+            current.attrs.update(kept=len(kept), zero=zero, dust=dust)
+
+    VALUATION_TOKENS.add(len(kept), "kept")
+    VALUATION_TOKENS.add(zero, "zero")
+    VALUATION_TOKENS.add(dust, "dust")
+    # decimals 未知的 token 排在最後
+    kept.sort(key=lambda valuation: (valuation.usd is None, -(valuation.usd or 0)))
+    return {valuation.address: valuation for valuation in kept}